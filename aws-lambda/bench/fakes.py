@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Offline Stand-ins
+A local HTTP server replaying recorded blog responses, plus throwaway
+Supabase and S3 clients built on local_backends, so the monitor can run
+without the internet
+"""
+
+import hashlib
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from local_backends import LocalQuery, LocalSupabase, LocalS3Client
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+class FakeQuery(LocalQuery):
+    def execute(self):
+        self.client.calls.append((self.table, self.operation))
+        return super().execute()
+
+
+class FakeSupabase(LocalSupabase):
+    """
+    LocalSupabase in an in-memory database, seeded with tables given as
+    lists of row dicts; every executed query is appended to `calls` as
+    (table, operation).
+    """
+
+    def __init__(self, tables=None):
+        super().__init__(':memory:')
+        self.calls = []
+        for name, rows in (tables or {}).items():
+            if rows:
+                LocalQuery(self, name).insert(rows).execute()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeS3(LocalS3Client):
+    """LocalS3Client keeping its objects in a temporary directory, removed with the client"""
+
+    def __init__(self):
+        self.directory = tempfile.TemporaryDirectory(prefix='fake-s3-')
+        super().__init__(self.directory.name)
+
+
+def load_fixtures():
+    """Recorded responses by kind: 'feed' for fixtures/feeds, 'html' for fixtures/html"""
+    return {
+        'feed': [path.read_bytes() for path in sorted((FIXTURES / 'feeds').glob('*.xml'))],
+        'html': [path.read_bytes() for path in sorted((FIXTURES / 'html').glob('*.html')) if path.name != 'no_posts.html'],
+    }
+
+
+class BlogSite:
+    """One synthetic blog: a home page and, for feed blogs, a feed at /feed"""
+
+    def __init__(self, kind, page, feed=None):
+        self.kind = kind
+        self.page = page
+        self.feed = feed
+
+    def response(self, path):
+        """(status, content type, body) for a path on this blog"""
+        if path in ('', '/'):
+            return 200, 'text/html; charset=utf-8', self.page
+        if path == '/feed' and self.feed is not None:
+            return 200, 'application/rss+xml', self.feed
+        return 404, 'text/html', b'<html><body>Not found</body></html>'
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under load, adding 1s SYN retries to latencies
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class BlogServer:
+    """
+    Local HTTP server for many synthetic blogs, one per loopback address
+
+    Blog i is served at http://127.x.y.z:port/ so every blog is its own host
+    to the rate limiter and connection pools. Responses carry an ETag and
+    honour If-None-Match, so a second run sees 304s like a real one.
+    """
+
+    def __init__(self, blogs, feed_share=0.7):
+        self.fixtures = load_fixtures()
+        self.sites = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = _Server(('0.0.0.0', 0), self.handler_class())
+        self.port = self.server.server_address[1]
+        self.urls = [self.add_site(index, index % 10 < feed_share * 10) for index in range(blogs)]
+
+    def host_for(self, index):
+        index += 1
+        return f"127.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+    def add_site(self, index, has_feed):
+        host = f"{self.host_for(index)}:{self.port}"
+        if has_feed:
+            feed = self.fixtures['feed'][index % len(self.fixtures['feed'])]
+            page = f'<html><head><link rel="alternate" type="application/rss+xml" href="/feed"></head><body><p>Blog {index}</p></body></html>'.encode()
+            site = BlogSite('feed', page, feed)
+        else:
+            site = BlogSite('html', self.fixtures['html'][index % len(self.fixtures['html'])])
+        self.sites[host] = site
+        return f"http://{host}/"
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                site = server.sites.get(self.headers.get('Host', ''))
+                if site is None:
+                    status, content_type, body = 404, 'text/plain', b''
+                else:
+                    status, content_type, body = site.response(self.path.split('?')[0].rstrip('/') or '/')
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    status, body = 304, b''
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if status in (200, 304):
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
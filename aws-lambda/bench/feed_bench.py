@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Feed Parsing Benchmark
+Compares the bounded fast feed mode with a full feedparser parse on the
+feeds in fixtures/feeds plus generated large feeds: checks that both give
+the same parse_feed_content output and reports time and peak memory.
+
+Usage:
+    python bench/feed_bench.py [--entries 300] [--entry-kb 20] [--max-entries 10]
+"""
+
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from blog_monitor import BlogMonitor
+from feed_extract import FeedParser
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'feeds'
+
+
+def generate_rss(entries, entry_kb):
+    paragraph = '<p>' + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 16 + '</p>'
+    body = paragraph * max(1, entry_kb * 1024 // len(paragraph))
+    items = ''.join(
+        f"<item><title>Post {i}</title><link>https://big.example.com/posts/{i}</link>"
+        f"<guid>https://big.example.com/posts/{i}</guid><pubDate>Mon, 06 May 2024 10:00:00 +0000</pubDate>"
+        f"<description>Summary of post {i}</description>"
+        f"<content:encoded><![CDATA[{body}]]></content:encoded></item>\n"
+        for i in range(entries)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel>'
+        '<title>Big RSS</title><link>https://big.example.com/</link><description>Generated</description>'
+        + items + '</channel></rss>'
+    ).encode('utf-8')
+
+
+def generate_atom(entries, entry_kb):
+    paragraph = '&lt;p&gt;' + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 16 + '&lt;/p&gt;'
+    body = paragraph * max(1, entry_kb * 1024 // len(paragraph))
+    items = ''.join(
+        f'<entry><title>Entry {i}</title><link href="https://atom.example.com/e/{i}"/>'
+        f'<id>tag:atom.example.com,2024:{i}</id><updated>2024-05-06T10:00:00Z</updated>'
+        f'<summary>Summary {i}</summary><content type="html">{body}</content></entry>\n'
+        for i in range(entries)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+        '<title>Big Atom</title><link href="https://atom.example.com/"/>' + items + '</feed>'
+    ).encode('utf-8')
+
+
+def measure(func, content, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = func(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fast feed parsing against feedparser')
+    parser.add_argument('--entries', type=int, default=300, help='Entries in each generated feed')
+    parser.add_argument('--entry-kb', type=int, default=20, help='Content size of each generated entry')
+    parser.add_argument('--max-entries', type=int, default=10, help='Entries kept by the fast mode')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs per parser (best is reported)')
+    args = parser.parse_args()
+
+    monitor = BlogMonitor()
+    full = FeedParser(mode='full')
+    fast = FeedParser(mode='fast', max_entries=args.max_entries)
+
+    corpus = [(path.name, path.read_bytes()) for path in sorted(FIXTURES.glob('*.xml'))]
+    corpus.append(('generated_rss', generate_rss(args.entries, args.entry_kb)))
+    corpus.append(('generated_atom', generate_atom(args.entries, args.entry_kb)))
+
+    failures = 0
+    for name, content in corpus:
+        full_feed, full_time, full_peak = measure(full.parse, content, args.repeat)
+        fast_feed, fast_time, fast_peak = measure(fast.parse, content, args.repeat)
+
+        expected = monitor.parse_feed_content(full_feed)
+        actual = monitor.parse_feed_content(fast_feed)
+        expected['posts'] = expected['posts'][:args.max_entries]
+        actual['posts'] = actual['posts'][:args.max_entries]
+
+        status = 'ok' if actual == expected else 'MISMATCH'
+        if status != 'ok':
+            failures += 1
+        print(
+            f"{status:8} {name} ({len(content) // 1024} KB): "
+            f"feedparser {full_time * 1000:.1f}ms / {full_peak / 1e6:.1f} MB, "
+            f"fast {fast_time * 1000:.1f}ms / {fast_peak / 1e6:.1f} MB"
+        )
+        if status != 'ok':
+            print('  expected: ' + json.dumps(expected, ensure_ascii=False)[:2000])
+            print('  actual:   ' + json.dumps(actual, ensure_ascii=False)[:2000])
+
+    print(f"{len(corpus) - failures}/{len(corpus)} feeds match")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
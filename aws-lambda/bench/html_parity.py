@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+HTML Extraction Parity Check
+Runs the streaming extractor and the BeautifulSoup reference implementation
+over every page in fixtures/html (or the files given on the command line)
+and reports any difference in the extracted posts.
+
+Usage:
+    python bench/html_parity.py [--timing] [page.html ...]
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from blog_monitor import BlogMonitor
+from html_extract import extract_html_posts
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'html'
+FIXTURE_URL = 'https://example.com/blog/'
+
+
+def time_call(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare streaming and BeautifulSoup HTML extraction')
+    parser.add_argument('pages', nargs='*', help='HTML files to check (default: fixtures/html/*.html)')
+    parser.add_argument('--timing', action='store_true', help='Also report the best-of-5 parse time of each')
+    args = parser.parse_args()
+
+    pages = [Path(page) for page in args.pages] or sorted(FIXTURES.glob('*.html'))
+    monitor = BlogMonitor()
+    failures = 0
+
+    for page in pages:
+        html = page.read_text(encoding='utf-8')
+        expected = monitor.parse_html_content_bs4(html, FIXTURE_URL)
+        actual = extract_html_posts(html, FIXTURE_URL)
+
+        if actual == expected:
+            status = 'ok'
+        else:
+            status = 'MISMATCH'
+            failures += 1
+
+        line = f"{status:8} {page.name}: {len(expected['posts'])} posts"
+        if args.timing:
+            bs4_time = time_call(monitor.parse_html_content_bs4, html, FIXTURE_URL)
+            stream_time = time_call(extract_html_posts, html, FIXTURE_URL)
+            line += f", bs4 {bs4_time * 1000:.1f}ms, streaming {stream_time * 1000:.1f}ms"
+        print(line)
+
+        if status != 'ok':
+            print('  expected: ' + json.dumps(expected, ensure_ascii=False))
+            print('  actual:   ' + json.dumps(actual, ensure_ascii=False))
+
+    print(f"{len(pages) - failures}/{len(pages)} pages match")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
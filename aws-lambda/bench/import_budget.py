@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Import-time Budget
+Measures how long importing the Lambda handler module takes in a fresh
+interpreter (python -X importtime) and fails when it is over budget or
+when a lazily loaded library is imported at module load.
+
+Usage:
+    python bench/import_budget.py [--budget-ms 250] [--runs 5] [--top 10]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+LAMBDA_ROOT = Path(__file__).resolve().parent.parent
+
+HANDLER_MODULE = 'blog_monitor_lambda'
+
+# Only imported on the code paths that need them
+LAZY_MODULES = ('boto3', 'botocore', 'supabase', 'bs4', 'feedparser', 'dateutil')
+
+
+def run_python(args):
+    env = dict(os.environ, PYTHONPATH=str(LAMBDA_ROOT))
+    env.pop('EAGER_IMPORTS', None)
+    # Run from /tmp so the repo's supabase/ directory cannot shadow the package
+    return subprocess.run([sys.executable] + args, cwd='/tmp', env=env, capture_output=True, text=True, check=True)
+
+
+def measure_import():
+    """
+    Import the handler module once in a fresh interpreter
+
+    Returns:
+        Tuple of (total microseconds, {module imported by the handler: cumulative microseconds})
+    """
+    output = run_python(['-X', 'importtime', '-c', f"import {HANDLER_MODULE}"]).stderr
+    total, children = None, {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # Nesting is shown by two spaces of indent per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == HANDLER_MODULE:
+            total = int(cumulative_us)
+        elif depth == 1:
+            children[name.strip()] = int(cumulative_us)
+    return total, children
+
+
+def loaded_lazy_modules():
+    code = (
+        f"import sys, json, {HANDLER_MODULE}; "
+        f"print(json.dumps(sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)))"
+    )
+    return json.loads(run_python(['-c', code]).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the Lambda handler import time against a budget')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', '250')), help='Allowed import time')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to measure (best is used)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports made by the handler module to list')
+    args = parser.parse_args()
+
+    # The first run also writes .pyc files, as the container build does
+    run_python(['-c', f"import {HANDLER_MODULE}"])
+
+    best_total, best_modules = None, None
+    for _ in range(args.runs):
+        total, modules = measure_import()
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+
+    print(f"import {HANDLER_MODULE}: {best_total / 1000:.1f}ms (best of {args.runs}), budget {args.budget_ms:.0f}ms")
+    slowest = sorted(((us, name) for name, us in best_modules.items()), reverse=True)
+    for us, name in slowest[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+
+    failures = []
+    lazy = loaded_lazy_modules()
+    if lazy:
+        failures.append(f"imported at module load: {', '.join(lazy)}")
+    if best_total / 1000 > args.budget_ms:
+        failures.append(f"{best_total / 1000:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Monitor Benchmark
+Runs the monitor against thousands of synthetic blogs served by a local
+HTTP stand-in that replays the recorded responses in fixtures/, with
+in-memory Supabase and S3, and reports throughput, p50/p99 latency and peak
+memory per scenario.
+
+Scenarios:
+    parse_feed   parse_feed_content over the recorded feeds
+    parse_html   parse_html_content over the recorded HTML pages
+    detect       detect_new_posts on ten-post lists with one new post
+    fetch_cold   fetch_blog_content for every blog with nothing cached
+    fetch_warm   fetch_blog_content again, with feed URLs and ETags known
+    lambda_run   a full LambdaBlogMonitor run (fetch, diff, cache, DB writes)
+
+Usage:
+    python bench/monitor_bench.py [--blogs 1000] [--scenarios fetch_cold,fetch_warm]
+    python bench/monitor_bench.py --save-baseline bench/baseline.json
+    python bench/monitor_bench.py --baseline bench/baseline.json [--tolerance 0.25]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from metrics import percentile
+
+SCENARIOS = ('parse_feed', 'parse_html', 'detect', 'fetch_cold', 'fetch_warm', 'lambda_run')
+
+
+def configure_environment(polite):
+    """Settings for an offline run, applied before the monitor modules read them"""
+    os.environ.setdefault('SMTP_USERNAME', '')
+    os.environ['ADAPTIVE_SCHEDULE'] = 'false'
+    os.environ['METRICS_ENABLED'] = 'false'
+    if not polite:
+        # Every synthetic blog is its own host, but a blog with no advertised feed is asked
+        # for its page and then each feed path in turn, which the default pacing would slow
+        os.environ['HOST_RATE_LIMIT'] = '1000'
+        os.environ['HOST_BURST'] = '100'
+        os.environ['HONOUR_CRAWL_DELAY'] = 'false'
+
+
+class Scenario:
+    """Times one scenario: per-operation latencies, wall time and memory"""
+
+    def __init__(self, name, trace_memory):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.latencies = []
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.peak_mb = None
+        if self.trace_memory:
+            self.peak_mb = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+            tracemalloc.stop()
+        return False
+
+    def timed(self, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        return result
+
+    def result(self, ops=None):
+        ops = ops if ops is not None else len(self.latencies)
+        latencies = sorted(self.latencies) or [0.0]
+        return {
+            'ops': ops,
+            'seconds': round(self.seconds, 3),
+            'ops_per_sec': round(ops / self.seconds, 1) if self.seconds else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'peak_mb': self.peak_mb,
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        }
+
+
+def run_parse_feed(monitor, fixtures, ops, trace_memory):
+    feeds = [monitor.feed_parser.parse(content) for content in fixtures['feed']]
+    with Scenario('parse_feed', trace_memory) as scenario:
+        for index in range(ops):
+            scenario.timed(monitor.parse_feed_content, feeds[index % len(feeds)])
+    return scenario.result()
+
+
+def run_parse_html(monitor, fixtures, ops, trace_memory):
+    pages = [(content.decode('utf-8', 'replace'), f"https://site{index}.example.com/") for index, content in enumerate(fixtures['html'])]
+    with Scenario('parse_html', trace_memory) as scenario:
+        for index in range(ops):
+            html, url = pages[index % len(pages)]
+            scenario.timed(monitor.parse_html_content, html, url)
+    return scenario.result()
+
+
+def run_detect(monitor, ops, trace_memory):
+    old_posts = [{'title': f"Post {i}", 'link': f"https://blog.example.com/posts/{i}"} for i in range(1, 11)]
+    new_posts = [{'title': 'Post 0', 'link': 'https://blog.example.com/posts/0'}] + old_posts[:9]
+    with Scenario('detect', trace_memory) as scenario:
+        for _ in range(ops):
+            scenario.timed(monitor.detect_new_posts, old_posts, new_posts)
+    return scenario.result()
+
+
+def run_fetch(name, monitor, urls, concurrency, trace_memory):
+    with Scenario(name, trace_memory) as scenario:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda url: scenario.timed(monitor.fetch_blog_content, url), urls))
+    failed = sum(1 for result in results if result is None)
+    if failed:
+        print(f"  {name}: {failed} of {len(urls)} fetches failed")
+    return scenario.result()
+
+
+def run_lambda(urls, trace_memory):
+    from fakes import FakeSupabase, FakeS3
+    from cache_store import ShardedCacheStore, MemoryBackend
+    from metrics import RunMetrics
+    from blog_monitor_lambda import LambdaBlogMonitor, run_single
+
+    admin_blogs = [{'id': index, 'url': url, 'name': f"Blog {index}", 'is_active': True} for index, url in enumerate(urls)]
+    supabase = FakeSupabase({
+        'admin_blogs': admin_blogs,
+        'blogs': [{'id': f"ub{index}", 'user_id': f"user{index % 50}", 'url': url} for index, url in enumerate(urls)],
+        'profiles': [{'id': f"user{index}", 'email': f"user{index}@example.com"} for index in range(50)]
+    })
+    # Per-blog latency comes from the runner's blog_ms timer
+    metrics = RunMetrics(enabled=True)
+    monitor = LambdaBlogMonitor(supabase, FakeS3(), 'bench-cache', cache_store=ShardedCacheStore(MemoryBackend()), metrics=metrics)
+
+    with Scenario('lambda_run', trace_memory) as scenario:
+        summary = run_single(monitor, supabase)
+    scenario.latencies = metrics.histograms.get('blog_ms', [])
+    if summary.get('failed'):
+        print(f"  lambda_run: {summary['failed']} blogs failed")
+    return scenario.result(ops=summary.get('checked', 0) + summary.get('failed', 0))
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against the baseline; returns the scenarios that regressed"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        throughput = result['ops_per_sec'] / base['ops_per_sec'] - 1 if base['ops_per_sec'] else 0.0
+        p99 = result['p99_ms'] / base['p99_ms'] - 1 if base['p99_ms'] else 0.0
+        regressed = throughput < -tolerance or p99 > tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:12} throughput {throughput:+.0%}  p99 {p99:+.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the blog monitor offline')
+    parser.add_argument('--blogs', type=int, default=1000, help='Synthetic blogs to serve (1k-50k)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('MAX_CONCURRENCY', '16')), help='Concurrent fetches')
+    parser.add_argument('--feed-share', type=float, default=0.7, help='Share of blogs that have a feed')
+    parser.add_argument('--memory', action='store_true', help='Trace peak Python memory per scenario (slower)')
+    parser.add_argument('--polite', action='store_true', help='Keep the default host rate limits')
+    parser.add_argument('--save-baseline', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare results with this JSON file and exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed throughput drop / p99 rise against the baseline')
+    args = parser.parse_args()
+
+    configure_environment(args.polite)
+    from fakes import BlogServer, load_fixtures
+    from blog_monitor import BlogMonitor
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fixtures = load_fixtures()
+    server = BlogServer(args.blogs, feed_share=args.feed_share).start()
+    print(f"Serving {args.blogs} blogs on port {server.port}")
+
+    results = {}
+    try:
+        monitor = BlogMonitor()
+        for name in scenarios:
+            if name == 'parse_feed':
+                results[name] = run_parse_feed(monitor, fixtures, args.blogs, args.memory)
+            elif name == 'parse_html':
+                results[name] = run_parse_html(monitor, fixtures, args.blogs, args.memory)
+            elif name == 'detect':
+                results[name] = run_detect(monitor, args.blogs, args.memory)
+            elif name == 'fetch_cold':
+                results[name] = run_fetch(name, monitor, server.urls, args.concurrency, args.memory)
+            elif name == 'fetch_warm':
+                if 'fetch_cold' not in results:
+                    run_fetch('fetch_cold', monitor, server.urls, args.concurrency, False)
+                results[name] = run_fetch(name, monitor, server.urls, args.concurrency, args.memory)
+            elif name == 'lambda_run':
+                results[name] = run_lambda(server.urls, args.memory)
+
+            result = results[name]
+            peak = f", peak {result['peak_mb']} MB" if result['peak_mb'] is not None else ''
+            print(
+                f"{name:12} {result['ops']:>7} ops in {result['seconds']:.2f}s = {result['ops_per_sec']:.1f}/s, "
+                f"p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms{peak}, max RSS {result['max_rss_mb']} MB"
+            )
+        print(f"{server.requests} HTTP requests served")
+    finally:
+        server.stop()
+
+    report = {'blogs': args.blogs, 'concurrency': args.concurrency, 'results': results}
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2, sort_keys=True) + '\n')
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get('blogs') != args.blogs:
+            print(f"Note: baseline was recorded with {baseline.get('blogs')} blogs")
+        print(f"Against {args.baseline}:")
+        if compare(results, baseline.get('results', {}), args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
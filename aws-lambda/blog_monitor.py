@@ -5,82 +5,393 @@ Blog Monitor System
 Converts blog websites to markdown and monitors for new posts
 """
 
-import requests
-from bs4 import BeautifulSoup
 import json
 import hashlib
 import time
 import os
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urljoin
 import re
-import feedparser
+from http_session import get_session
+from host_limiter import get_rate_limiter
+from metrics import RunMetrics
+from html_extract import learn_profile, apply_profile, score_posts
+from feed_extract import FeedParser
+from body_reader import BodyReader
+from content_digest import body_digest
 import logging
+import threading
 import urllib3, ssl
 
-class BlogMonitor:
-    def __init__(self):
+# Returned by fetch_blog_content when the server says nothing changed (HTTP 304)
+NOT_MODIFIED = object()
+
+# Returned by fetch_feed when the request itself failed (transport error, 429 or 5xx), not the feed
+FETCH_FAILED = object()
+
+_process_configured = False
+_process_lock = threading.Lock()
+
+
+def configure_process():
+    """Process-wide SSL and logging setup, done once rather than per monitor"""
+    global _process_configured
+    if _process_configured:
+        return
+    with _process_lock:
+        if _process_configured:
+            return
         # Disable SSL warnings globally
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         
         # Create unverified SSL context (use with caution)
         ssl._create_default_https_context = ssl._create_unverified_context
         
-        self.setup_logging()
-        
-    def setup_logging(self):
-        """Setup logging configuration"""
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
+        _process_configured = True
+
+def extract_domain_name(url):
+    """Extract clean domain name from URL"""
+    domain = re.sub(r'https?://', '', url)
+    domain = re.sub(r'www\.', '', domain)
+    domain = domain.split('/')[0]
+    return domain
+
+
+class BlogMonitor:
+    # Common feed locations, probed when a blog's feed URL is not yet known
+    FEED_PATHS = ['/feed', '/rss', '/atom.xml', '/feed.xml', '/rss.xml']
+    FEED_LINK_TYPES = ('application/rss+xml', 'application/atom+xml')
+    
+    def __init__(self, feed_ttl=None, session=None, rate_limiter=None, metrics=None):
+        configure_process()
+        
+        # Pooled keep-alive session shared with every other monitor in the process
+        self.session = session or get_session()
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        # Per-host pacing, shared like the session so concurrent checks of one host share its budget.
+        # The limiter outlives this monitor, so it gets the plain function, not a bound method.
+        self.rate_limiter = rate_limiter or get_rate_limiter(
+            key_func=extract_domain_name,
+            session=self.session,
+            user_agent=self.headers['User-Agent']
+        )
+        
+        # Seconds before a discovered feed URL (or HTML-only verdict) is re-checked
+        self.feed_ttl = feed_ttl or int(os.environ.get('FEED_DISCOVERY_TTL', str(7 * 24 * 3600)))
+        # Treat a 200 whose normalised body hashes the same as last time like a 304
+        self.content_digest = os.environ.get('CONTENT_DIGEST', 'true').lower() == 'true'
+        self.blog_state = {}
+        self.extraction_profiles = {}
+        self.feed_parser = FeedParser()
+        # Phase timings and counters for the run; free when METRICS_ENABLED=false
+        self.metrics = metrics or RunMetrics()
+        # Byte caps, binary rejection and early stops for response bodies
+        self.body_reader = BodyReader(self.metrics)
+        
+        self.setup_logging()
+        
+    def setup_logging(self):
+        """Setup logging configuration"""
         self.logger = logging.getLogger(__name__)
     
     def extract_domain_name(self, url):
         """Extract clean domain name from URL"""
-        domain = re.sub(r'https?://', '', url)
-        domain = re.sub(r'www\.', '', domain)
-        domain = domain.split('/')[0]
-        return domain
+        return extract_domain_name(url)
+    
+    def http_get(self, url, timeout=15, headers=None, kind='html'):
+        """
+        GET a URL with the monitor's default headers, paced by the host rate limiter
+        
+        A 429/503 is retried once after the host's Retry-After or backoff,
+        unless that is longer than the limiter's max_wait. The body is
+        streamed in under the byte cap for kind ('html' or 'feed'), and a
+        feed stops downloading once it has the entries the parser keeps.
+        
+        Raises:
+            DownloadAborted: if the body is binary, too large or too slow
+        """
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+        for attempt in range(2):
+            waited = self.rate_limiter.acquire(url)
+            with self.metrics.timer('http_ms'):
+                response = self.session.get(url, headers=request_headers, timeout=timeout, verify=False, stream=True)
+            if self.metrics.enabled:
+                self.metrics.count('http_requests')
+                if waited:
+                    self.metrics.observe('host_wait_ms', waited * 1000)
+            delay = self.rate_limiter.record(url, response)
+            if delay is None or delay > self.rate_limiter.max_wait:
+                break
+            # The throttled response's body is never read
+            response.close()
+        
+        scanner = self.feed_parser.scanner() if kind == 'feed' and response.status_code == 200 else None
+        with self.metrics.timer('download_ms'):
+            self.body_reader.read(response, kind, scanner)
+        return response
+    
+    def conditional_get(self, url, state, kind='html'):
+        """
+        GET a URL with If-None-Match / If-Modified-Since from the blog state
+        
+        The validators from a 200 response are written back into state.
+        """
+        headers = {}
+        validators = state.get('validators') or {}
+        if validators.get('url') == url:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        
+        response = self.http_get(url, headers=headers, kind=kind)
+        if response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                state['validators'] = {'url': url, 'etag': etag, 'last_modified': last_modified}
+            else:
+                state.pop('validators', None)
+        return response
+    
+    def response_digest(self, url, response, kind):
+        """Digest of a 200 response's normalised body, or None when digests are off"""
+        if not self.content_digest:
+            return None
+        return {'url': url, 'value': body_digest(response.content, kind)}
+    
+    def digest_unchanged(self, state, digest):
+        """
+        Whether a body digest matches the one kept from the last parsed response
+        
+        Digests are only kept once their body has parsed, so a broken
+        response is never mistaken for an unchanged one.
+        """
+        if digest is not None and state.get('digest') == digest:
+            self.metrics.count('digest_unchanged')
+            return True
+        return False
+    
+    def load_blog_state(self, blog_url):
+        """Load per-blog fetch state (discovered feed URL etc.)"""
+        return dict(self.blog_state.get(blog_url, {}))
+    
+    def save_blog_state(self, blog_url, state):
+        """Save per-blog fetch state"""
+        self.blog_state[blog_url] = state
+    
+    def load_extraction_profile(self, blog_url):
+        """Load the learned HTML extraction profile for a blog"""
+        return self.extraction_profiles.get(blog_url)
+    
+    def save_extraction_profile(self, blog_url, profile):
+        """Save the learned HTML extraction profile for a blog"""
+        self.extraction_profiles[blog_url] = profile
+    
+    def get_cached_feed_info(self, state):
+        """Return the remembered discovery verdict if it is still within its TTL"""
+        feed_info = state.get('feed')
+        if not feed_info:
+            return None
+        if time.time() - feed_info.get('discovered_at', 0) > self.feed_ttl:
+            return None
+        return feed_info
+    
+    def find_feed_links(self, html, url):
+        """Find RSS/Atom feeds advertised with <link rel="alternate"> in a page"""
+        feed_links = []
+        for tag in re.findall(r'<link\b[^>]*>', html[:200000], re.IGNORECASE):
+            attrs = dict(
+                (name.lower(), value)
+                for name, _, value in re.findall(r'([\w-]+)\s*=\s*(["\'])(.*?)\2', tag)
+            )
+            if 'alternate' not in attrs.get('rel', '').lower().split():
+                continue
+            if attrs.get('type', '').lower() not in self.FEED_LINK_TYPES:
+                continue
+            if attrs.get('href'):
+                feed_links.append(urljoin(url + '/', attrs['href']))
+        return feed_links
+    
+    def fetch_feed(self, feed_url, state=None):
+        """
+        Fetch and parse a feed URL
+        
+        Returns:
+            Parsed feed, NOT_MODIFIED, FETCH_FAILED when the request failed
+            in a way that may pass, or None when the URL is not a usable feed
+        """
+        state = state if state is not None else {}
+        try:
+            response = self.conditional_get(feed_url, state, kind='feed')
+        except Exception:
+            return FETCH_FAILED
+        try:
+            if response.status_code == 304:
+                return NOT_MODIFIED
+            if response.status_code == 429 or response.status_code >= 500:
+                return FETCH_FAILED
+            if response.status_code != 200:
+                return None
+            digest = self.response_digest(feed_url, response, 'feed')
+            if self.digest_unchanged(state, digest):
+                return NOT_MODIFIED
+            with self.metrics.timer('feed_parse_ms'):
+                feed = self.feed_parser.parse(response.content)
+            if not feed.entries:
+                return None
+            if digest:
+                state['digest'] = digest
+            return feed
+        except Exception:
+            return None
+    
+    def probe_feeds(self, feed_urls):
+        """
+        Try feed URLs one at a time, in order
+        
+        Probes run inside the runner's slot for the host, so running them
+        one after another keeps discovery within the per-host cap.
+        
+        Returns:
+            Tuple of (feed_url, probe_state, feed) for the first that parses,
+            FETCH_FAILED when every probe failed to fetch, or None
+        """
+        all_failed = bool(feed_urls)
+        for feed_url in feed_urls:
+            probe_state = {}
+            feed = self.fetch_feed(feed_url, probe_state)
+            if feed is not FETCH_FAILED:
+                all_failed = False
+            if feed and feed is not NOT_MODIFIED and feed is not FETCH_FAILED:
+                return feed_url, probe_state, feed
+        return FETCH_FAILED if all_failed else None
+    
+    def discover_feed(self, url, state, keep_feed=False):
+        """
+        Find a blog's feed, falling back to its HTML page
+        
+        The page is fetched first. Feeds it advertises are tried, and the
+        common feed paths are only probed when it advertises none.
+        
+        Args:
+            keep_feed: The remembered feed failed to fetch; if every probe
+                fails to fetch too, return (None, None) so the blog keeps
+                its feed instead of switching to HTML until the TTL runs out
+        
+        Returns:
+            Tuple of (feed_info, blog_data)
+        """
+        base_url = url.rstrip('/')
+        page_state = {}
+        try:
+            page = self.conditional_get(url, page_state)
+            page.raise_for_status()
+        except Exception as e:
+            self.logger.info(f"HTML page unavailable for {url}: {str(e)}")
+            page = None
+        
+        # Feeds the site advertises itself win over guessed paths
+        advertised = list(dict.fromkeys(self.find_feed_links(page.text, base_url))) if page is not None else []
+        found = self.probe_feeds(advertised or [base_url + path for path in self.FEED_PATHS])
+        if found is FETCH_FAILED:
+            if keep_feed:
+                self.logger.info(f"Feed probes for {url} failed to fetch, keeping the remembered feed")
+                return None, None
+            found = None
+        if found:
+            feed_url, probe_state, feed = found
+            self.update_validators(state, probe_state)
+            return {'mode': 'feed', 'url': feed_url}, self.parse_feed_content(feed)
+        
+        if page is None:
+            return None, None
+        with self.metrics.timer('html_parse_ms'):
+            blog_data = self.parse_html_content(page.text, url)
+        page_state['digest'] = self.response_digest(url, page, 'html')
+        self.update_validators(state, page_state)
+        return {'mode': 'html'}, blog_data
+    
+    def update_validators(self, state, fetch_state):
+        """Copy validators and the body digest captured by a fetch into the blog state"""
+        for key in ('validators', 'digest'):
+            if fetch_state.get(key):
+                state[key] = fetch_state[key]
+            else:
+                state.pop(key, None)
     
     def fetch_blog_content(self, url):
-        """Fetch blog content using multiple methods"""
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+        """
+        Fetch blog content, going straight to the remembered feed when known
         
+        Returns:
+            Parsed blog data, NOT_MODIFIED when the server answered 304, or None on error
+        """
         try:
-            # Try RSS/Atom feed first
-            feed_urls = [
-                url + '/feed',
-                url + '/rss',
-                url + '/atom.xml',
-                url + '/feed.xml',
-                url + '/rss.xml'
-            ]
-            
-            for feed_url in feed_urls:
-                try:
-                    feed = feedparser.parse(feed_url)
-                    if feed.entries:
-                        return self.parse_feed_content(feed)
-                except:
-                    continue
-            
-            # Fallback to HTML scraping
-            response = requests.get(url, headers=headers, timeout=15, verify=False)
-            response.raise_for_status()
-            return self.parse_html_content(response.text, url)
+            state = self.load_blog_state(url)
+            original_state = json.dumps(state, sort_keys=True)
+            with self.metrics.timer('fetch_ms'):
+                blog_data = self.fetch_with_state(url, state)
+            if json.dumps(state, sort_keys=True) != original_state:
+                self.save_blog_state(url, state)
+            return blog_data
             
         except Exception as e:
             self.logger.error(f"Error fetching {url}: {str(e)}")
             return None
     
+    def fetch_with_state(self, url, state):
+        """Fetch blog content using and updating the per-blog state"""
+        feed_info = self.get_cached_feed_info(state)
+        keep_feed = False
+        
+        if feed_info and feed_info['mode'] == 'feed':
+            feed = self.fetch_feed(feed_info['url'], state)
+            if feed is NOT_MODIFIED:
+                return NOT_MODIFIED
+            if feed is FETCH_FAILED:
+                # A 429/5xx or network error alone must not switch the blog to HTML
+                keep_feed = True
+            elif feed:
+                return self.parse_feed_content(feed)
+            self.logger.info(f"Remembered feed {feed_info['url']} failed, rediscovering")
+        elif feed_info and feed_info['mode'] == 'html':
+            response = self.conditional_get(url, state)
+            if response.status_code == 304:
+                return NOT_MODIFIED
+            response.raise_for_status()
+            digest = self.response_digest(url, response, 'html')
+            if self.digest_unchanged(state, digest):
+                return NOT_MODIFIED
+            with self.metrics.timer('html_parse_ms'):
+                blog_data = self.parse_html_content(response.text, url)
+            if digest:
+                state['digest'] = digest
+            return blog_data
+        
+        self.metrics.count('discoveries')
+        with self.metrics.timer('discover_ms'):
+            feed_info, blog_data = self.discover_feed(url, state, keep_feed)
+        if feed_info:
+            feed_info['discovered_at'] = time.time()
+            state['feed'] = feed_info
+        return blog_data
+    
     def parse_feed_content(self, feed):
         """Parse RSS/Atom feed content"""
         posts = []
         for entry in feed.entries[:10]:  # Limit to recent 10 posts
             post = {
+                'guid': entry.get('id', ''),
                 'title': entry.get('title', 'No Title'),
                 'link': entry.get('link', ''),
                 'published': entry.get('published', ''),
@@ -97,7 +408,37 @@ class BlogMonitor:
         }
     
     def parse_html_content(self, html, url):
-        """Parse HTML content to extract blog posts"""
+        """
+        Parse HTML content to extract blog posts
+        
+        Uses the blog's learned extraction profile, and learns a new one
+        when there is none or it no longer finds any posts. Profiles are
+        kept per blog URL rather than per domain: a domain's blogs can
+        fall in different cache shards, and a shard may only be written
+        by the worker that owns it.
+        """
+        try:
+            profile = self.load_extraction_profile(url)
+            if profile:
+                blog_data = apply_profile(html, url, profile)
+                if score_posts(blog_data['posts']):
+                    return blog_data
+                self.logger.info(f"Extraction profile for {url} found no posts, re-learning")
+            
+            learned, blog_data = learn_profile(html, url)
+            if learned:
+                learned['learned_at'] = time.time()
+                self.save_extraction_profile(url, learned)
+                self.logger.info(f"Learned extraction profile for {url}: {learned['selector']}")
+            return blog_data
+        except Exception as e:
+            self.logger.warning(f"Streaming HTML extraction failed for {url}, using BeautifulSoup: {str(e)}")
+            return self.parse_html_content_bs4(html, url)
+
+    def parse_html_content_bs4(self, html, url):
+        """Parse HTML content to extract blog posts with BeautifulSoup (reference implementation)"""
+        # Only needed when the streaming extractor fails, so kept off the import path
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html, 'html.parser')
         
         # Remove unwanted elements
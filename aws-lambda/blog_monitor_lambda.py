@@ -1,97 +1,131 @@
 
 import json
-import boto3
 import os
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import itertools
+import threading
 from datetime import datetime
-from blog_monitor import BlogMonitor
-from supabase import create_client
+from blog_monitor import BlogMonitor, NOT_MODIFIED
+from blog_runner import ConcurrentBlogRunner
+from blog_source import iter_active_blog_pages, iter_blog_pages_by_id, read_ahead, CheckedBlogMarker
+from post_writer import BlogPostWriter
+from smtp_dispatcher import SMTPDispatcher
+from notification_digest import NotificationDigest
+from seen_index import SeenPostIndex
+from cache_store import ShardedCacheStore, S3Backend
+from check_scheduler import CheckScheduler
+from host_limiter import stats_delta
+from metrics import RunMetrics
+from fan_out import FanOutCoordinator, FanInStore, LocalDispatcher, LambdaInvokeDispatcher
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# boto3 and supabase dominate cold start, so they are imported when a client
+# is first needed and the clients are kept at module scope for warm invocations
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, factory):
+    """Get a process-wide client, creating it with factory on first use"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def get_supabase_client():
+    def create():
+        from supabase import create_client
+        return create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_SERVICE_ROLE_KEY'])
+    return get_client('supabase', create)
+
+
+def get_s3_client():
+    def create():
+        import boto3
+        return boto3.client('s3')
+    return get_client('s3', create)
+
+
+def get_lambda_client():
+    def create():
+        import boto3
+        from botocore.config import Config
+        # Workers are queued as Event invocations, which return at once; an invoke
+        # is not retried, as a retry after a lost response would queue the shard twice
+        return boto3.client('lambda', config=Config(
+            read_timeout=30,
+            retries={'max_attempts': 0}
+        ))
+    return get_client('lambda', create)
+
+
+def preload():
+    """Import the lazily loaded libraries now, for EAGER_IMPORTS=true"""
+    import boto3
+    import supabase
+    import feedparser
+    import dateutil.parser
+    import bs4
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler for blog monitoring
     Runs daily to check all blogs for new posts
+    
+    The event's 'mode' (or RUN_MODE) picks how the run is done:
+      single      - check every active blog in this invocation (default)
+      coordinator - split active blogs into shards and dispatch each to a worker
+      worker      - check the blogs listed in the event's 'blog_ids'
+      fan_in      - add up fan-out run 'run_id' with the results saved so far
+                    and send its digests, for a run a failed worker left open
     """
+    metrics = None
+    summary = None
     try:
-        # Initialize Supabase client
-        supabase_url = os.environ['SUPABASE_URL']
-        supabase_key = os.environ['SUPABASE_SERVICE_ROLE_KEY']
-        supabase = create_client(supabase_url, supabase_key)
-        
-        # Initialize S3 for cache storage
-        s3_client = boto3.client('s3')
-        cache_bucket = os.environ['CACHE_BUCKET_NAME']
+        event = event or {}
+        mode = event.get('mode') or os.environ.get('RUN_MODE', 'single')
         
-        # Create modified BlogMonitor class for Lambda
-        monitor = LambdaBlogMonitor(supabase, s3_client, cache_bucket)
+        # One EMF document per run, per mode, written even when the run fails
+        metrics = RunMetrics(dimensions={'Mode': mode})
         
-        # Get all blogs from admin_blogs table
-        blogs_response = supabase.table('admin_blogs').select('*').eq('is_active', True).execute()
-        
-        if not blogs_response.data:
-            logger.info("No active blogs found")
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'No active blogs to check',
-                    'checked': 0,
-                    'updated': 0
-                })
-            }
-        
-        checked_count = 0
-        updated_count = 0
-        
-        # Check each blog
-        for blog in blogs_response.data:
-            try:
-                logger.info(f"Checking blog: {blog['url']}")
-                
-                # Check blog for updates
-                new_posts = monitor.check_blog_lambda(blog)
-
-                logger.info("I am alive")
-                
-                if new_posts:
-                    updated_count += 1
-                    
-                    # Update user blogs and blog posts
-                    monitor.update_user_blogs_and_posts(blog, new_posts)
-                    
-                    # Send notifications
-                    monitor.send_notifications(blog, new_posts)
-                
-                checked_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error checking blog {blog['url']}: {str(e)}")
-                continue
+        # Supabase and S3 clients are created once per container
+        supabase = get_supabase_client()
+        s3_client = get_s3_client()
+        cache_bucket = os.environ['CACHE_BUCKET_NAME']
         
-        # Update admin_blogs last_checked timestamp
-        supabase.table('admin_blogs').update({
-            'last_checked': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }).in_('url', [blog['url'] for blog in blogs_response.data]).execute()
+        with metrics.timer('run_ms'):
+            if mode == 'coordinator':
+                cache_store = ShardedCacheStore(S3Backend(s3_client, cache_bucket))
+                results_backend = get_fan_in_backend(s3_client, cache_bucket)
+                summary = run_coordinator(supabase, create_dispatcher(context), cache_store, results_backend, metrics)
+            elif mode == 'fan_in':
+                fan_in = FanInStore(get_fan_in_backend(s3_client, cache_bucket), event['run_id'])
+                summary = finish_fan_out(fan_in, supabase, emit=False)
+            else:
+                # Create modified BlogMonitor class for Lambda
+                monitor = LambdaBlogMonitor(supabase, s3_client, cache_bucket, metrics=metrics)
+                if mode == 'worker':
+                    summary = run_worker(monitor, supabase, event, get_fan_in_backend(s3_client, cache_bucket))
+                else:
+                    summary = run_single(monitor, supabase)
         
+        summary['timestamp'] = datetime.now().isoformat()
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'message': f'Blog check completed successfully',
-                'checked': checked_count,
-                'updated': updated_count,
-                'timestamp': datetime.now().isoformat()
-            })
+            'body': json.dumps(summary)
         }
         
     except Exception as e:
         logger.error(f"Lambda execution error: {str(e)}")
+        if metrics is not None:
+            metrics.count('run_errors')
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -99,6 +133,200 @@ def lambda_handler(event, context):
                 'timestamp': datetime.now().isoformat()
             })
         }
+    
+    finally:
+        if metrics is not None:
+            metrics.emit(summary)
+
+
+def create_dispatcher(context):
+    """Dispatch workers in-process when DISPATCH_MODE=local, else as invocations of this function"""
+    if os.environ.get('DISPATCH_MODE', 'lambda') == 'local':
+        return LocalDispatcher(lambda_handler)
+    
+    function_name = os.environ.get('WORKER_FUNCTION_NAME') or context.invoked_function_arn
+    return LambdaInvokeDispatcher(get_lambda_client(), function_name)
+
+
+def get_fan_in_backend(s3_client, bucket):
+    """Storage for fan-out worker results, next to the cache shards"""
+    return S3Backend(s3_client, bucket, prefix=os.environ.get('FANIN_PREFIX', 'fan_out/'))
+
+
+def run_coordinator(supabase, dispatcher, cache_store, results_backend, metrics=None):
+    """Fan the run out over worker shards; the last worker to finish sends the digests"""
+    coordinator = FanOutCoordinator(
+        supabase, dispatcher, cache_store, results_backend,
+        on_complete=lambda fan_in: finish_fan_out(fan_in, supabase),
+        metrics=metrics
+    )
+    summary = coordinator.run()
+    summary['message'] = 'Blog check completed successfully'
+    return summary
+
+
+def run_worker(monitor, supabase, event, results_backend=None):
+    """
+    Check one shard of blogs sent by a coordinator
+    
+    A worker of a fan-out run (one with a 'run_id') saves its summary and
+    digest posts for the run instead of sending a digest, and the worker
+    that completes the run adds up all of them.
+    """
+    pages = iter_blog_pages_by_id(supabase, event.get('blog_ids') or [], monitor.post_writer.id_chunk_size)
+    run_id = event.get('run_id')
+    
+    summary = run_blogs(monitor, supabase, pages, cache_shards=event.get('cache_shards'), send_digest=not run_id)
+    summary['shard'] = event.get('shard')
+    # The shard identifies the worker's EMF document; it is not a metric
+    monitor.metrics.set_property('shard', event.get('shard'))
+    if run_id:
+        fan_in = FanInStore(results_backend or get_fan_in_backend(monitor.s3_client, monitor.cache_bucket), run_id)
+        fan_in.save_result(event['shard'], summary, monitor.digest.export() if monitor.digest is not None else {})
+        if fan_in.report(event['shard']):
+            finish_fan_out(fan_in, supabase)
+    return summary
+
+
+def finish_fan_out(fan_in, supabase, emit=True):
+    """
+    Add up a finished fan-out run and send one digest per user for all of it
+    
+    Args:
+        emit: Publish the totals as their own EMF document (Mode=fan_in)
+    """
+    mailer = SMTPDispatcher()
+    digest = None
+    if os.environ.get('NOTIFICATION_DIGEST', 'true').lower() == 'true':
+        digest = NotificationDigest(supabase, mailer)
+    
+    summary = fan_in.add_up(digest)
+    if digest is not None:
+        digest.send()
+    email_stats = mailer.flush()
+    mailer.close()
+    summary['emails_sent'] += email_stats['sent']
+    summary['emails_failed'] += email_stats['failed']
+    
+    fan_in.save_summary(summary)
+    logger.info(f"Fan-out run {fan_in.run_id} finished: {summary}")
+    if emit:
+        RunMetrics(dimensions={'Mode': 'fan_in'}).emit(summary)
+    return summary
+
+
+def run_single(monitor, supabase):
+    """Check every active blog in this invocation, reading admin_blogs a page at a time"""
+    pages = read_ahead(iter_active_blog_pages(supabase))
+    
+    # Look at the first page so an empty table still gets its own message
+    first_page = next(pages, None)
+    if first_page is None:
+        logger.info("No active blogs found")
+        return {
+            'message': 'No active blogs to check',
+            'checked': 0,
+            'updated': 0
+        }
+    
+    return run_blogs(monitor, supabase, itertools.chain([first_page], pages))
+
+
+def run_blogs(monitor, supabase, pages, cache_shards=None, send_digest=True):
+    """
+    Check blogs page by page, then write posts, send notifications and mark them checked
+    
+    Pages stream through the scheduler and the runner, posts are written in
+    batches as they fill up and admin_blogs.last_checked is bumped a chunk
+    at a time as blogs finish, so memory does not grow with the number of blogs.
+    
+    Args:
+        pages: Iterable of lists of admin_blogs rows
+        send_digest: Send the digest at the end; off when a fan-out run sends it
+    """
+    metrics = monitor.metrics
+    
+    # A cache layout mismatch stops the run before any blog is checked
+    monitor.cache_store.check_layout()
+    if cache_shards:
+        # A worker only owns the cache shards its blogs are in
+        monitor.cache_store.restrict_writes(cache_shards)
+    
+    def cached_pages(pages):
+        # Read only the cache shards of each page's blogs, as the page comes up,
+        # and hold them until those blogs are done or passed over
+        for page in pages:
+            urls = [blog['url'] for blog in page]
+            monitor.cache_store.hold(urls)
+            with metrics.timer('cache_load_ms'):
+                monitor.cache_store.prefetch(urls)
+            yield page
+    
+    def release(blog):
+        # A shard with no blog left in flight is written and dropped from memory
+        monitor.cache_store.release(blog['url'])
+    
+    runner = ConcurrentBlogRunner(monitor)
+    pages = cached_pages(pages)
+    
+    # Only check blogs whose next check is due, most urgent first
+    counts = {'skipped': 0}
+    if monitor.scheduler is not None:
+        pages = monitor.scheduler.due_pages(pages, counts, on_skip=release)
+    
+    def due_blogs():
+        for page in pages:
+            yield from runner.interleave_by_host(page)
+    
+    # Check blogs concurrently; each blog's failures stay isolated
+    checked_marker = CheckedBlogMarker(supabase, monitor.post_writer.id_chunk_size)
+    limiter_before = monitor.rate_limiter.stats()
+    
+    def blog_done(blog, error):
+        try:
+            checked_marker.mark(blog['id'])
+        finally:
+            release(blog)
+    
+    results = runner.run(due_blogs(), on_complete=blog_done)
+    limiter_stats = monitor.rate_limiter.stats()
+    rate_limit = stats_delta(limiter_before, limiter_stats)
+    if monitor.scheduler is not None:
+        logger.info(f"{results['checked'] + results['failed']} blogs due for a check, {counts['skipped']} not yet due")
+    logger.info(f"Host rate limiter: {rate_limit}, busiest hosts {limiter_stats['busiest_hosts']}")
+    
+    # Write back the cache shards that changed and are still in memory
+    with metrics.timer('cache_save_ms'):
+        monitor.cache_store.flush()
+    
+    # Write the remaining queued blog posts and subscriber last_checked updates
+    with metrics.timer('db_write_ms'):
+        write_stats = monitor.post_writer.flush()
+    
+    # Render one digest per user, then send queued emails over the SMTP pool
+    with metrics.timer('smtp_ms'):
+        if monitor.digest is not None and send_digest:
+            monitor.digest.send()
+        email_stats = monitor.mailer.flush()
+        monitor.mailer.close()
+    
+    # Bump admin_blogs last_checked for the blogs in the last partial chunk
+    checked_marker.flush()
+    
+    return {
+        'message': f'Blog check completed successfully',
+        'checked': results['checked'],
+        'updated': results['updated'],
+        'failed': results['failed'],
+        'skipped': counts['skipped'],
+        'rows_written': write_stats['rows_written'],
+        'posts_written': write_stats['posts_written'],
+        'batches_sent': write_stats['batches_sent'],
+        'emails_sent': email_stats['sent'],
+        'emails_failed': email_stats['failed'],
+        'throttled': rate_limit['throttled'],
+        'host_wait_seconds': rate_limit['wait_seconds']
+    }
 
 
 class LambdaBlogMonitor(BlogMonitor):
@@ -106,14 +334,27 @@ class LambdaBlogMonitor(BlogMonitor):
     Modified BlogMonitor class for AWS Lambda execution
     """
     
-    def __init__(self, supabase_client, s3_client, cache_bucket):
-        super().__init__()
+    def __init__(self, supabase_client, s3_client, cache_bucket, cache_store=None, metrics=None):
+        super().__init__(metrics=metrics)
         self.supabase = supabase_client
         self.s3_client = s3_client
         self.cache_bucket = cache_bucket
+        # Per-blog state and seen-post indexes live in a few shard objects
+        self.cache_store = cache_store or ShardedCacheStore(S3Backend(s3_client, cache_bucket))
+        self.post_writer = BlogPostWriter(supabase_client)
+        self.mailer = SMTPDispatcher()
+        # Queued notifications are sent at the end of the run so a slow mail server never holds up checks
+        self.queue_notifications = os.environ.get('QUEUE_NOTIFICATIONS', 'true').lower() == 'true'
+        self.digest = None
+        if os.environ.get('NOTIFICATION_DIGEST', 'true').lower() == 'true':
+            self.digest = NotificationDigest(supabase_client, self.mailer)
+        # Blogs are checked only when due, based on post rate and recent no-change checks
+        self.scheduler = None
+        if os.environ.get('ADAPTIVE_SCHEDULE', 'true').lower() == 'true':
+            self.scheduler = CheckScheduler(self.cache_store)
     
     def load_cache_from_s3(self, blog_url):
-        """Load previous posts cache from S3"""
+        """Load the legacy per-blog posts cache from S3 (used to seed seen indexes)"""
         try:
             cache_key = f"blog_cache/{self.get_cache_filename(blog_url)}"
             response = self.s3_client.get_object(Bucket=self.cache_bucket, Key=cache_key)
@@ -137,6 +378,36 @@ class LambdaBlogMonitor(BlogMonitor):
         except Exception as e:
             self.logger.error(f"Error saving cache to S3: {str(e)}")
     
+    def load_seen_index(self, blog_url):
+        """Load the seen-post index from the cache store, or None if this blog has none yet"""
+        data = self.cache_store.get_bytes(blog_url, 'seen')
+        try:
+            return SeenPostIndex.from_bytes(data) if data else None
+        except Exception as e:
+            self.logger.error(f"Error loading seen index: {str(e)}")
+            return None
+    
+    def save_seen_index(self, blog_url, seen_index):
+        """Save the seen-post index to the cache store"""
+        self.cache_store.put_bytes(blog_url, 'seen', seen_index.to_bytes())
+    
+    def load_blog_state(self, blog_url):
+        """Load per-blog fetch state (discovered feed URL etc.) from the cache store"""
+        return self.cache_store.get(blog_url, 'state', {})
+    
+    def save_blog_state(self, blog_url, state):
+        """Save per-blog fetch state to the cache store"""
+        self.cache_store.put(blog_url, 'state', state)
+    
+    def load_extraction_profile(self, blog_url):
+        """Load the blog's HTML extraction profile from the cache store"""
+        # Kept in the blog's own entry so it is written with the blog's shard, never another worker's
+        return self.cache_store.get(blog_url, 'extraction')
+    
+    def save_extraction_profile(self, blog_url, profile):
+        """Save the blog's HTML extraction profile to the cache store"""
+        self.cache_store.put(blog_url, 'extraction', profile)
+    
     def get_cache_filename(self, blog_url):
         """Generate cache filename from blog URL"""
         import hashlib
@@ -145,65 +416,105 @@ class LambdaBlogMonitor(BlogMonitor):
     def check_blog_lambda(self, blog):
         """Check a single blog for updates (Lambda version)"""
         blog_data = self.fetch_blog_content(blog['url'])
+        if blog_data is NOT_MODIFIED:
+            self.metrics.count('not_modified')
+            self.logger.info(f"Not modified since last check: {blog['url']}")
+            self.record_check(blog, None, [])
+            return []
         if not blog_data:
             return []
         
-        # Load previous posts from S3 cache
-        previous_posts = self.load_cache_from_s3(blog['url'])
+        # Load the seen-post index, seeding it from the legacy JSON post cache once
+        seen_index = self.load_seen_index(blog['url'])
+        if seen_index is None:
+            seen_index = SeenPostIndex()
+            seen_index.add_many(self.load_cache_from_s3(blog['url']))
         current_posts = blog_data['posts']
         
         # Detect new posts
-        new_posts = self.detect_new_posts(previous_posts, current_posts)
+        with self.metrics.timer('diff_ms'):
+            new_posts = seen_index.filter_new(current_posts)
+            seen_index.add_many(current_posts)
+        if seen_index.changed:
+            self.save_seen_index(blog['url'], seen_index)
+        self.record_check(blog, current_posts, new_posts)
         
         if new_posts:
+            self.metrics.count('new_posts', len(new_posts))
             self.logger.info(f"Found {len(new_posts)} new posts in {blog['url']}")
-            
-            # Save current posts to S3 cache
-            self.save_cache_to_s3(blog['url'], current_posts)
-            
             return new_posts
         else:
             self.logger.info(f"No new posts found in {blog['url']}")
             return []
     
+    def record_check(self, blog, posts, new_posts):
+        """Schedule a blog's next check from the outcome of this one"""
+        if self.scheduler is None:
+            return
+        try:
+            self.scheduler.record(blog['url'], posts, new_posts)
+        except Exception as e:
+            self.logger.error(f"Error scheduling next check for {blog['url']}: {str(e)}")
+    
     def update_user_blogs_and_posts(self, blog, new_posts):
-        """Update user blogs and create blog posts for all users who have this blog"""
+        """Queue blog posts for all users who have this blog on the run's batched writer"""
         try:
             # Get all users who have this blog URL
-            user_blogs_response = self.supabase.table('blogs').select('*').eq('url', blog['url']).execute()
+            user_blogs_response = self.supabase.table('blogs').select('id, user_id').eq('url', blog['url']).execute()
             
             if not user_blogs_response.data:
                 self.logger.info(f"No users have blog {blog['url']}")
                 return
             
+            detected_at = datetime.now().isoformat()
+            posts_data = [{
+                'title': post.get('title', 'No Title'),
+                'content': post.get('content', ''),
+                'summary': post.get('summary', ''),
+                # Empty links become NULL so they never collide on (blog_id, link)
+                'link': post.get('link') or None,
+                'published_date': self.parse_published_date(post.get('published', '')),
+                'detected_at': detected_at,
+                'is_new': True
+            } for post in new_posts]
+            
+            if self.post_writer.storage == 'reference':
+                # Posts without a link have no shared key, so they are still copied per subscriber
+                shared = [post_data for post_data in posts_data if post_data['link']]
+                posts_data = [post_data for post_data in posts_data if not post_data['link']]
+                self.post_writer.add_shared_posts([
+                    (self.shared_post_row(blog, post_data), [
+                        dict(post_data, blog_id=user_blog['id'], summary=None, content=None)
+                        for user_blog in user_blogs_response.data
+                    ])
+                    for post_data in shared
+                ])
+            
+            rows = []
             for user_blog in user_blogs_response.data:
-                # Update user's blog last_checked timestamp
-                self.supabase.table('blogs').update({
-                    'last_checked': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                }).eq('id', user_blog['id']).execute()
-                
-                # Create blog posts for this user
-                for post in new_posts:
-                    post_data = {
-                        'blog_id': user_blog['id'],
-                        'title': post.get('title', 'No Title'),
-                        'content': post.get('content', ''),
-                        'summary': post.get('summary', ''),
-                        'link': post.get('link', ''),
-                        'published_date': self.parse_published_date(post.get('published', '')),
-                        'detected_at': datetime.now().isoformat(),
-                        'is_new': True
-                    }
-                    
-                    # Insert blog post
-                    self.supabase.table('blog_posts').insert(post_data).execute()
-                    
-                self.logger.info(f"Created {len(new_posts)} posts for user {user_blog['user_id']}")
+                rows.extend(dict(post_data, blog_id=user_blog['id']) for post_data in posts_data)
+            
+            if rows:
+                self.post_writer.add_rows(rows)
+            self.post_writer.mark_checked([user_blog['id'] for user_blog in user_blogs_response.data])
+            
+            self.logger.info(f"Queued {len(new_posts)} posts for {len(user_blogs_response.data)} users of {blog['url']}")
                 
         except Exception as e:
             self.logger.error(f"Error updating user blogs and posts: {str(e)}")
     
+    def shared_post_row(self, blog, post_data):
+        """posts row for a new post, keyed by the admin_blogs URL it was found on"""
+        return {
+            'source_url': blog['url'],
+            'link': post_data['link'],
+            'title': post_data['title'],
+            'published_date': post_data['published_date'],
+            'summary': post_data['summary'],
+            'content': post_data['content'],
+            'detected_at': post_data['detected_at']
+        }
+    
     def parse_published_date(self, published_str):
         """Parse published date string to ISO format"""
         if not published_str:
@@ -218,45 +529,27 @@ class LambdaBlogMonitor(BlogMonitor):
             return None
     
     def send_smtp_email(self, to_email, subject, body):
-        """Send email via SMTP (Gmail)"""
+        """Send email via the pooled SMTP dispatcher (Gmail by default)"""
         try:
-            smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-            smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-            smtp_username = os.environ.get('SMTP_USERNAME')
-            smtp_password = os.environ.get('SMTP_PASSWORD')
-            
-            if not all([smtp_username, smtp_password]):
-                self.logger.info("SMTP credentials not configured, skipping email")
-                return False
-            
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = smtp_username
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body to email
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Create SMTP session
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()  # Enable security
-            server.login(smtp_username, smtp_password)
-            
-            # Send email
-            text = msg.as_string()
-            server.sendmail(smtp_username, to_email, text)
-            server.quit()
-            
-            self.logger.info(f"Email sent successfully to {to_email}")
-            return True
-            
+            return self.mailer.send(to_email, subject, body)
         except Exception as e:
             self.logger.error(f"Error sending email: {str(e)}")
             return False
     
+    def deliver_email(self, to_email, subject, body):
+        """Queue the email for the end-of-run flush, or send it right away"""
+        if self.queue_notifications:
+            self.mailer.queue(to_email, subject, body)
+            return True
+        return self.send_smtp_email(to_email, subject, body)
+    
     def send_notifications(self, blog, new_posts):
         """Send email notifications to specific users who own the blog"""
+        if self.digest is not None:
+            # Collected here, sent as one email per user at the end of the run
+            self.digest.add(blog, new_posts)
+            return
+        
         try:
             # Get users who have this blog
             user_blogs_response = self.supabase.table('blogs').select(
@@ -305,7 +598,13 @@ class LambdaBlogMonitor(BlogMonitor):
                     body += "\n" + "-"*40 + "\n\n"
                 
                 # Send email via SMTP
-                self.send_smtp_email(user_email, subject, body)
+                self.deliver_email(user_email, subject, body)
                 
         except Exception as e:
             self.logger.error(f"Error sending notifications: {str(e)}")
+
+
+# With provisioned concurrency or SnapStart, init time is paid ahead of
+# requests, so importing everything up front takes it off the first run
+if os.environ.get('EAGER_IMPORTS', 'false').lower() == 'true':
+    preload()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Concurrent Blog Runner
+Checks many blogs at once with a global and a per-host concurrency cap,
+taking blogs from a stream with a bounded number in flight
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentBlogRunner:
+    """
+    Runs check_blog_lambda, update_user_blogs_and_posts and send_notifications
+    for many blogs on a thread pool. A failure in one blog never affects the
+    others.
+
+    Blogs are submitted as workers free up, with at most max_pending
+    submitted but unfinished, so a generator of blogs is never read further
+    ahead than that.
+    """
+
+    def __init__(self, monitor, max_workers=None, max_per_host=None, max_pending=None):
+        self.monitor = monitor
+        self.max_workers = max_workers or int(os.environ.get('MAX_CONCURRENCY', '16'))
+        self.max_per_host = max_per_host or int(os.environ.get('MAX_PER_HOST', '2'))
+        self.max_pending = max_pending or int(os.environ.get('MAX_PENDING', str(self.max_workers * 4)))
+        # host -> [semaphore, threads using it]; dropped when unused so hosts do not pile up
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    @contextmanager
+    def host_slot(self, url):
+        """Hold one of the slots limiting concurrent fetches against url's host"""
+        host = self.monitor.extract_domain_name(url)
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = [threading.BoundedSemaphore(self.max_per_host), 0]
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._host_lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._host_slots[host]
+
+    def interleave_by_host(self, blogs):
+        """Order blogs round-robin across hosts so workers rarely wait on a host slot"""
+        by_host = OrderedDict()
+        for blog in blogs:
+            host = self.monitor.extract_domain_name(blog['url'])
+            by_host.setdefault(host, []).append(blog)
+
+        ordered = []
+        queues = list(by_host.values())
+        index = 0
+        while queues:
+            remaining = []
+            for queue in queues:
+                if index < len(queue):
+                    ordered.append(queue[index])
+                    remaining.append(queue)
+            queues = remaining
+            index += 1
+        return ordered
+
+    def process_blog(self, blog):
+        """Check a single blog, then store and announce any new posts"""
+        logger.info(f"Checking blog: {blog['url']}")
+
+        metrics = self.monitor.metrics
+        with metrics.timer('blog_ms'):
+            # Only the fetch talks to the blog's host, so only it holds the host slot
+            with self.host_slot(blog['url']):
+                with metrics.timer('check_ms'):
+                    new_posts = self.monitor.check_blog_lambda(blog)
+
+            if new_posts:
+                self.monitor.update_user_blogs_and_posts(blog, new_posts)
+                self.monitor.send_notifications(blog, new_posts)
+
+        return new_posts
+
+    def collect(self, future, results, on_complete):
+        blog = future.blog
+        error = None
+        try:
+            new_posts = future.result()
+        except Exception as e:
+            logger.error(f"Error checking blog {blog['url']}: {str(e)}")
+            results['failed'] += 1
+            error = e
+        else:
+            results['checked'] += 1
+            if new_posts:
+                results['updated'] += 1
+
+        if on_complete is not None:
+            try:
+                on_complete(blog, error)
+            except Exception as e:
+                logger.error(f"Error finishing blog {blog['url']}: {str(e)}")
+
+    def run(self, blogs, on_complete=None):
+        """
+        Process all blogs concurrently
+
+        Args:
+            blogs: List or iterator of blogs, read only as workers free up
+            on_complete: Called with each blog and its error (None on success) once it is done
+
+        Returns:
+            Dictionary with 'checked', 'updated' and 'failed' counts
+        """
+        results = {'checked': 0, 'updated': 0, 'failed': 0}
+        if isinstance(blogs, list):
+            if not blogs:
+                return results
+            blogs = self.interleave_by_host(blogs)
+
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for blog in blogs:
+                if len(pending) >= self.max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.collect(future, results, on_complete)
+
+                future = executor.submit(self.process_blog, blog)
+                future.blog = blog
+                pending.add(future)
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.collect(future, results, on_complete)
+
+        return results
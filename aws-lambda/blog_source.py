@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Streaming Blog Source
+Reads admin_blogs a page at a time with keyset pagination and marks
+finished blogs checked in chunks, so a run never holds every blog at once
+"""
+
+import os
+import queue
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# The only admin_blogs columns a check reads
+BLOG_COLUMNS = 'id, url'
+
+_END = object()
+
+
+def iter_active_blog_pages(supabase_client, page_size=None, columns=BLOG_COLUMNS):
+    """
+    Yield pages of active admin_blogs ordered by id
+
+    Each page starts after the last id of the one before (keyset
+    pagination), so every page costs the same however deep into the
+    table it is.
+    """
+    page_size = page_size or int(os.environ.get('BLOG_PAGE_SIZE', '1000'))
+    last_id = None
+    while True:
+        query = supabase_client.table('admin_blogs').select(columns).eq('is_active', True)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        page = query.order('id').limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]['id']
+
+
+def iter_blog_pages_by_id(supabase_client, blog_ids, chunk_size, columns=BLOG_COLUMNS):
+    """Yield pages of the active admin_blogs with the given ids, chunk_size ids per query"""
+    for start in range(0, len(blog_ids), chunk_size):
+        page = supabase_client.table('admin_blogs').select(columns).eq('is_active', True).in_(
+            'id', blog_ids[start:start + chunk_size]
+        ).execute().data or []
+        if page:
+            yield page
+
+
+def read_ahead(pages, depth=None):
+    """
+    Iterate pages while a background thread reads the next ones
+
+    At most depth pages wait in the queue, so a slow consumer holds back
+    the reader instead of letting pages pile up in memory. Errors from the
+    reader are raised in the consumer.
+    """
+    depth = depth or int(os.environ.get('BLOG_PAGE_READ_AHEAD', '2'))
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up once the consumer has gone, instead of blocking on a full queue
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            page = pending.get()
+            if page is _END:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+
+
+class CheckedBlogMarker:
+    """
+    Collects admin_blogs ids as their checks finish and bumps last_checked
+    for every chunk_size of them in one update. Ids are short, so unlike
+    URLs a chunk always fits in the query string.
+    """
+
+    def __init__(self, supabase_client, chunk_size=None):
+        self.supabase = supabase_client
+        self.chunk_size = chunk_size or int(os.environ.get('ID_CHUNK_SIZE', '200'))
+        self._ids = []
+        self._lock = threading.Lock()
+        self.stats = {'marked': 0, 'failed': 0}
+
+    def mark(self, blog_id):
+        """Queue one finished blog, writing a chunk once enough have finished"""
+        with self._lock:
+            self._ids.append(blog_id)
+            if len(self._ids) < self.chunk_size:
+                return
+            chunk, self._ids = self._ids, []
+        self.write(chunk)
+
+    def write(self, blog_ids):
+        now = datetime.now().isoformat()
+        try:
+            self.supabase.table('admin_blogs').update({
+                'last_checked': now,
+                'updated_at': now
+            }).in_('id', blog_ids).execute()
+            with self._lock:
+                self.stats['marked'] += len(blog_ids)
+        except Exception as e:
+            logger.error(f"Error updating last_checked for {len(blog_ids)} admin blogs: {str(e)}")
+            with self._lock:
+                self.stats['failed'] += len(blog_ids)
+
+    def flush(self):
+        """Write the last partial chunk; returns the stats"""
+        with self._lock:
+            chunk, self._ids = self._ids, []
+        if chunk:
+            self.write(chunk)
+        return dict(self.stats)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Bounded Body Reader
+Reads streamed HTTP responses chunk by chunk with a byte cap per kind of
+content and an overall deadline, rejects binary bodies from their first
+bytes and stops feeds early once enough entries have arrived
+"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Small enough that the deadline, checked between chunks, is checked often
+CHUNK_SIZE = 16 * 1024
+
+# Bytes looked at to decide whether a body is binary
+SNIFF_BYTES = 512
+
+# Media types never worth reading as a page or feed
+BINARY_TYPE_PREFIXES = ('image/', 'audio/', 'video/', 'font/', 'application/pdf', 'application/zip',
+                        'application/gzip', 'application/x-gzip', 'application/x-tar', 'application/x-7z',
+                        'application/x-rar', 'application/msword', 'application/vnd.ms-', 'application/wasm')
+
+# Signatures of binary formats, for bodies sent with a wrong or missing Content-Type
+BINARY_SIGNATURES = (b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'%PDF', b'PK\x03\x04', b'\x1f\x8b', b'BZh',
+                     b'7z\xbc\xaf', b'Rar!', b'\x00asm', b'wOFF', b'wOF2', b'OggS', b'ID3', b'fLaC')
+
+UTF16_BOMS = (b'\xff\xfe', b'\xfe\xff')
+
+
+class DownloadAborted(Exception):
+    """Raised when a body is dropped before it is parsed; reason is 'too_large', 'binary' or 'too_slow'"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def media_type(response):
+    return response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def looks_binary(head):
+    """Whether the first bytes of a body are a binary format rather than text"""
+    if head.startswith(BINARY_SIGNATURES):
+        return True
+    # Text in any encoding we parse has no NUL bytes, except UTF-16 which starts with a BOM
+    return b'\x00' in head and not head.startswith(UTF16_BOMS)
+
+
+class BodyReader:
+    """
+    Reads a response opened with stream=True into response.content
+
+    The body is decoded as it arrives (gzip and deflate always, brotli when
+    the Brotli package is installed), and reading stops with DownloadAborted
+    once it passes the cap for its kind or the deadline, which is checked
+    between chunks. A feed scanner can end the read early, in which case
+    the content is the feed cut after its last wanted entry.
+
+    Every body counts towards bytes_downloaded. Aborted and early-stopped
+    reads count fetches_aborted or fetches_stopped_early, plus bytes_saved
+    when the server gave a Content-Length.
+    """
+
+    def __init__(self, metrics, max_bytes=None, deadline=None):
+        self.metrics = metrics
+        self.max_bytes = max_bytes or {
+            'feed': int(os.environ.get('MAX_FEED_BYTES', str(10 * 1024 * 1024))),
+            'html': int(os.environ.get('MAX_HTML_BYTES', str(5 * 1024 * 1024)))
+        }
+        # Per-read timeouts let a server trickle bytes forever, so the whole body has a deadline too
+        self.deadline = deadline or float(os.environ.get('DOWNLOAD_DEADLINE', '30'))
+
+    def content_length(self, response):
+        try:
+            return int(response.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            return None
+
+    def wire_bytes(self, response):
+        """Bytes received from the socket so far, before decoding"""
+        try:
+            return response.raw.tell()
+        except Exception:
+            return 0
+
+    def stop(self, response, counter):
+        """Close a response that is being read no further, counting the bytes it did not send"""
+        length = self.content_length(response)
+        if length is not None:
+            self.metrics.count('bytes_saved', max(length - self.wire_bytes(response), 0))
+        self.metrics.count(counter)
+        response.close()
+
+    def abort(self, response, reason, message):
+        self.stop(response, 'fetches_aborted')
+        self.metrics.count(f"aborted_{reason}")
+        logger.info(f"Dropped {response.url}: {message}")
+        raise DownloadAborted(reason, message)
+
+    def read(self, response, kind, scanner=None):
+        """
+        Read a streamed response's body into response.content
+
+        Args:
+            kind: 'feed' or 'html', which picks the byte cap
+            scanner: Optional FeedScanner that may end the read early
+
+        Raises:
+            DownloadAborted: if the body is binary, over the cap or too slow
+        """
+        limit = self.max_bytes.get(kind) or max(self.max_bytes.values())
+        if media_type(response).startswith(BINARY_TYPE_PREFIXES):
+            self.abort(response, 'binary', f"binary Content-Type {media_type(response)}")
+        length = self.content_length(response)
+        if length is not None and length > limit:
+            self.abort(response, 'too_large', f"Content-Length {length} is over the {limit} byte cap")
+
+        chunks = []
+        size = 0
+        sniffed = False
+        started = time.monotonic()
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if not sniffed and size >= SNIFF_BYTES:
+                    sniffed = True
+                    if looks_binary(b''.join(chunks)[:SNIFF_BYTES]):
+                        self.abort(response, 'binary', 'body looks binary')
+                if size > limit:
+                    self.abort(response, 'too_large', f"body is over the {limit} byte cap")
+                if time.monotonic() - started > self.deadline:
+                    self.abort(response, 'too_slow', f"body took over {self.deadline:.0f}s")
+                if scanner is not None and scanner.feed(chunk):
+                    content = scanner.truncate(b''.join(chunks))
+                    self.stop(response, 'fetches_stopped_early')
+                    break
+            else:
+                content = b''.join(chunks)
+                if not sniffed and looks_binary(content[:SNIFF_BYTES]):
+                    self.abort(response, 'binary', 'body looks binary')
+        finally:
+            self.metrics.count('bytes_downloaded', size)
+
+        # requests serves .content and .text from _content once the body has been consumed
+        response._content = content
+        response._content_consumed = True
+        return content
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Sharded Cache Store
+Keeps the per-blog cache (fetch state, seen-post index, ...) for many blogs
+in a few shard objects keyed by hash prefix, instead of one object per blog
+"""
+
+import os
+import copy
+import gzip
+import json
+import base64
+import random
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Records the layout the stored shards were written with
+MANIFEST_KEY = 'manifest.json.gz'
+
+
+class CacheLayoutError(Exception):
+    """The stored shards were written with a different prefix length than the store's"""
+
+
+class ShardConflict(Exception):
+    """A shard kept changing under a conditional write"""
+
+
+class CorruptShard(Exception):
+    """A stored shard could not be decoded"""
+
+
+def decode_shard(shard, data):
+    """
+    Entries of a stored shard, or {} when it does not exist yet
+
+    Raises:
+        CorruptShard: if the data is not a gzipped JSON object
+    """
+    if not data:
+        return {}
+    try:
+        entries = json.loads(gzip.decompress(data).decode('utf-8'))
+    except Exception as e:
+        raise CorruptShard(f"Cache shard {shard} is corrupt: {str(e)}")
+    if not isinstance(entries, dict):
+        raise CorruptShard(f"Cache shard {shard} is corrupt: not an object")
+    return entries
+
+
+class MemoryBackend:
+    """In-memory storage backend, for tests and offline runs"""
+
+    def __init__(self):
+        self.objects = {}
+        self.versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.objects.get(key)
+
+    def get_versioned(self, key):
+        with self._lock:
+            return self.objects.get(key), self.versions.get(key)
+
+    def put(self, key, data):
+        with self._lock:
+            self.objects[key] = data
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def put_if(self, key, data, version):
+        with self._lock:
+            if self.versions.get(key) != version:
+                return False
+            self.objects[key] = data
+            self.versions[key] = (version or 0) + 1
+            return True
+
+
+class LocalDiskBackend:
+    """
+    Storage backend writing one file per key under a directory
+
+    Versions are content hashes, and conditional writes are only atomic
+    between stores in the same process.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        path = self.root / key
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def get_versioned(self, key):
+        data = self.get(key)
+        return data, hashlib.md5(data).hexdigest() if data is not None else None
+
+    def put_if(self, key, data, version):
+        with self._lock:
+            if self.get_versioned(key)[1] != version:
+                return False
+            self.put(key, data)
+            return True
+
+    def put(self, key, data):
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a crash never leaves a half-written shard
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+
+class S3Backend:
+    """Storage backend on an S3 bucket"""
+
+    def __init__(self, s3_client, bucket, prefix='blog_cache/shards/'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        """Object data and ETag, or (None, None) when there is no such key"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+            return response['Body'].read(), response.get('ETag')
+        except self.s3_client.exceptions.NoSuchKey:
+            return None, None
+
+    def put(self, key, data, **conditions):
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=data,
+            ContentType='application/gzip',
+            **conditions
+        )
+
+    def put_if(self, key, data, version):
+        """Write only if the object still has ETag version (or, for None, does not exist yet)"""
+        try:
+            self.put(key, data, **({'IfMatch': version} if version else {'IfNoneMatch': '*'}))
+            return True
+        except Exception as e:
+            # botocore's ClientError, matched by code so botocore is not imported here
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+
+
+class ShardedCacheStore:
+    """
+    Per-blog cache entries grouped into 16**prefix_length shards.
+
+    A blog's shard is the first prefix_length hex digits of the md5 of its
+    URL. Shards are loaded in bulk with load_all(), or only as the blogs in
+    them come up with prefetch(), changed in memory, and only shards that
+    changed are written back by flush(). Writing re-reads
+    the shard, applies only this store's changes on top and writes it back
+    only if it is still the version that was read, retrying otherwise, so
+    stores in other processes writing the same shard never undo each other.
+
+    A fan-out worker calls restrict_writes() with the shards it was given;
+    flush() then refuses to write any other shard.
+
+    A run that streams blogs page by page holds each blog's shard with
+    hold() and gives it back with release() once the blog is done; a shard
+    whose last blog is released is written (if it changed) and dropped from
+    memory, so only the shards of blogs still in flight stay loaded.
+
+    The prefix length decides which shard holds each blog, so it is fixed
+    for the life of the stored cache: the first store to use the backend
+    records it in a manifest, and a store configured with another length
+    raises CacheLayoutError instead of reading or writing shards. Changing
+    CACHE_SHARD_PREFIX_LENGTH therefore needs a new bucket prefix (or a
+    migration), never just a new value.
+    """
+
+    def __init__(self, backend, prefix_length=None, max_workers=None):
+        self.backend = backend
+        self.prefix_length = prefix_length or int(os.environ.get('CACHE_SHARD_PREFIX_LENGTH', '1'))
+        self.max_workers = max_workers or int(os.environ.get('CACHE_IO_WORKERS', '16'))
+        self._shards = {}
+        # shard -> set of (key, field) changed since the last flush
+        self._changes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._layout_checked = False
+        self._layout_lock = threading.Lock()
+        self.write_attempts = int(os.environ.get('CACHE_WRITE_ATTEMPTS', '5'))
+        self.writable_shards = None
+        # shard -> number of held blogs not yet released
+        self._holds = {}
+
+    def shard_for(self, key):
+        return hashlib.md5(key.encode()).hexdigest()[:self.prefix_length]
+
+    def shard_names(self):
+        return [format(i, f'0{self.prefix_length}x') for i in range(16 ** self.prefix_length)]
+
+    def shard_lock(self, shard):
+        with self._lock:
+            return self._locks.setdefault(shard, threading.RLock())
+
+    def shard_key(self, shard):
+        return f"shard-{shard}.json.gz"
+
+    def check_layout(self):
+        """
+        Make sure the stored shards use this store's prefix length, recording it on first use
+
+        Raises:
+            CacheLayoutError: if the manifest holds a different prefix length
+        """
+        if self._layout_checked:
+            return
+        with self._layout_lock:
+            if self._layout_checked:
+                return
+            data = self.backend.get(MANIFEST_KEY)
+            if data is None:
+                manifest = {'prefix_length': self.prefix_length}
+                # Only one of several stores starting at once gets to record the layout
+                if self.backend.put_if(MANIFEST_KEY, gzip.compress(json.dumps(manifest).encode('utf-8')), None):
+                    logger.info(f"Recorded cache layout: {manifest}")
+                    self._layout_checked = True
+                    return
+                data = self.backend.get(MANIFEST_KEY)
+
+            manifest = json.loads(gzip.decompress(data).decode('utf-8'))
+            if manifest.get('prefix_length') != self.prefix_length:
+                raise CacheLayoutError(
+                    f"Cache shards were written with prefix length {manifest.get('prefix_length')}, "
+                    f"not {self.prefix_length}; changing it would orphan every stored entry"
+                )
+            self._layout_checked = True
+
+    def load_shard(self, shard):
+        """Read one shard from the backend into memory"""
+        self.check_layout()
+        # Read and decode errors propagate: a shard that was not read must
+        # never be treated as empty, which would report its posts as new and
+        # overwrite its history on flush. Its blogs fail until it loads.
+        entries = decode_shard(shard, self.backend.get(self.shard_key(shard)))
+        with self.shard_lock(shard):
+            self._shards[shard] = entries
+        return entries
+
+    def load_all(self, shards=None):
+        """Load every shard (or the given ones) in parallel; shards that fail are retried on first use"""
+        # A layout mismatch stops the run here rather than failing every shard
+        self.check_layout()
+        self.load_parallel(self.load_shard, shards or self.shard_names())
+
+    def prefetch(self, keys):
+        """Load the shards holding the given keys that are not in memory yet, in parallel"""
+        self.check_layout()
+        shards = sorted({self.shard_for(key) for key in keys})
+        # entries() re-checks under the shard lock, so a shard loaded meanwhile is kept as is
+        self.load_parallel(self.entries, [shard for shard in shards if shard not in self._shards])
+
+    def load_parallel(self, load, shards):
+        if not shards:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {shard: executor.submit(load, shard) for shard in shards}
+            for shard, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error loading cache shard {shard}: {str(e)}")
+
+    def entries(self, shard):
+        with self.shard_lock(shard):
+            if shard not in self._shards:
+                self.load_shard(shard)
+            return self._shards[shard]
+
+    def get(self, key, field, default=None):
+        """Get a cached value for a blog"""
+        shard = self.shard_for(key)
+        entries = self.entries(shard)
+        with self.shard_lock(shard):
+            # Callers get a copy, so edits only land in the store through put()
+            return copy.deepcopy(entries.get(key, {}).get(field, default))
+
+    def put(self, key, field, value):
+        """Set a cached value for a blog, marking its shard for writing"""
+        shard = self.shard_for(key)
+        entries = self.entries(shard)
+        with self.shard_lock(shard):
+            entry = entries.setdefault(key, {})
+            if entry.get(field) == value:
+                return
+            entry[field] = copy.deepcopy(value)
+            with self._lock:
+                self._changes.setdefault(shard, set()).add((key, field))
+
+    def get_bytes(self, key, field):
+        value = self.get(key, field)
+        return base64.b64decode(value) if value is not None else None
+
+    def put_bytes(self, key, field, data):
+        self.put(key, field, base64.b64encode(data).decode('ascii'))
+
+    def restrict_writes(self, shards):
+        """Only let flush() write the given shards"""
+        self.writable_shards = set(shards)
+
+    def hold(self, keys):
+        """Keep the shards holding the given keys in memory until each key is released"""
+        with self._lock:
+            for key in keys:
+                shard = self.shard_for(key)
+                self._holds[shard] = self._holds.get(shard, 0) + 1
+
+    def release(self, key):
+        """Give back a held key, evicting its shard once no held key is left in it"""
+        shard = self.shard_for(key)
+        with self._lock:
+            holds = self._holds.get(shard, 0) - 1
+            if holds > 0:
+                self._holds[shard] = holds
+                return
+            self._holds.pop(shard, None)
+        self.evict(shard)
+
+    def evict(self, shard):
+        """
+        Write a shard's changes and drop it from memory
+
+        A shard whose write fails stays loaded with its changes queued, for
+        flush() to retry.
+
+        Returns:
+            True if the shard was dropped
+        """
+        with self.shard_lock(shard):
+            with self._lock:
+                # Held again meanwhile by a page that came up
+                if self._holds.get(shard):
+                    return False
+                changes = self._changes.pop(shard, None)
+
+            if changes and self.writable_shards is not None and shard not in self.writable_shards:
+                logger.error(f"Not writing cache shard {shard}, which belongs to another worker")
+                changes = None
+            if changes:
+                try:
+                    self.write_shard(shard, changes)
+                except Exception as e:
+                    logger.error(f"Error saving cache shard {shard}: {str(e)}")
+                    with self._lock:
+                        self._changes.setdefault(shard, set()).update(changes)
+                    return False
+
+            self._shards.pop(shard, None)
+            return True
+
+    def write_shard(self, shard, changes):
+        """
+        Apply changed fields to the latest stored copy of a shard and write it
+
+        Raises:
+            ShardConflict: if the shard changed under every attempt
+            CorruptShard: if the stored shard can not be decoded
+        """
+        self.check_layout()
+        with self.shard_lock(shard):
+            for attempt in range(self.write_attempts):
+                data, version = self.backend.get_versioned(self.shard_key(shard))
+                latest = decode_shard(shard, data)
+
+                entries = self._shards[shard]
+                for key, field in changes:
+                    if field in entries.get(key, {}):
+                        latest.setdefault(key, {})[field] = entries[key][field]
+                data = gzip.compress(json.dumps(latest, ensure_ascii=False).encode('utf-8'))
+                if self.backend.put_if(self.shard_key(shard), data, version):
+                    self._shards[shard] = latest
+                    return
+                logger.info(f"Cache shard {shard} changed while writing, retrying")
+                time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+            raise ShardConflict(f"Cache shard {shard} kept changing over {self.write_attempts} attempts")
+
+    def flush(self):
+        """
+        Write back every shard that changed
+
+        Returns:
+            Number of shards written
+        """
+        with self._lock:
+            changes, self._changes = self._changes, {}
+
+        if self.writable_shards is not None:
+            foreign = sorted(set(changes) - self.writable_shards)
+            if foreign:
+                logger.error(f"Not writing cache shards {foreign}, which belong to other workers")
+                for shard in foreign:
+                    del changes[shard]
+
+        written = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                shard: executor.submit(self.write_shard, shard, changes[shard])
+                for shard in sorted(changes)
+            }
+            for shard, future in futures.items():
+                try:
+                    future.result()
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Error saving cache shard {shard}: {str(e)}")
+                    with self._lock:
+                        self._changes.setdefault(shard, set()).update(changes[shard])
+        return written
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Adaptive Check Scheduler
+Works out when each blog is next worth checking from how often it posts
+and how many recent checks found nothing new
+"""
+
+import os
+import time
+import heapq
+import logging
+import itertools
+from datetime import timezone
+
+logger = logging.getLogger(__name__)
+
+# Post times kept per blog for the rate estimate
+MAX_POST_TIMES = 20
+
+
+def published_timestamp(published):
+    """Epoch seconds of a post's published date, or None if it cannot be parsed"""
+    if not published:
+        return None
+    try:
+        from dateutil import parser
+        parsed = parser.parse(published)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except Exception:
+        return None
+
+
+class CheckScheduler:
+    """
+    Per-blog next-due times, kept in the cache store under each blog's
+    'schedule' field.
+
+    The check interval starts at half the blog's mean gap between posts,
+    or default_interval when none are known. It grows by backoff for
+    every check in a row that found nothing new (304 or no new posts), up to
+    max_backoff times, and is clamped to [min_interval, max_interval].
+    Finding new posts resets the backoff.
+    """
+
+    def __init__(self, cache_store, min_interval=None, max_interval=None, default_interval=None,
+                 backoff=None, max_backoff=None, slack=None, max_per_run=None):
+        self.cache_store = cache_store
+        self.min_interval = min_interval or int(os.environ.get('SCHEDULE_MIN_INTERVAL', str(3600)))
+        self.max_interval = max_interval or int(os.environ.get('SCHEDULE_MAX_INTERVAL', str(7 * 24 * 3600)))
+        self.default_interval = default_interval or int(os.environ.get('SCHEDULE_DEFAULT_INTERVAL', str(24 * 3600)))
+        self.backoff = backoff or float(os.environ.get('SCHEDULE_BACKOFF', '1.5'))
+        self.max_backoff = max_backoff or float(os.environ.get('SCHEDULE_MAX_BACKOFF', '4'))
+        # Blogs due within this many seconds are checked now rather than a whole run late
+        if slack is None:
+            slack = int(os.environ.get('SCHEDULE_SLACK', str(15 * 60)))
+        self.slack = slack
+        # 0 means no limit on blogs checked per run
+        if max_per_run is None:
+            max_per_run = int(os.environ.get('SCHEDULE_MAX_PER_RUN', '0'))
+        self.max_per_run = max_per_run
+
+    def load(self, blog_url):
+        return self.cache_store.get(blog_url, 'schedule', {})
+
+    def urgency(self, schedule, now):
+        """How overdue a blog is, in multiples of its interval; never-checked blogs come first"""
+        if not schedule.get('next_due'):
+            return float('inf')
+        return (now - schedule['next_due']) / max(schedule.get('interval') or self.default_interval, 1)
+
+    def select_due(self, blogs, now=None):
+        """
+        Pick the blogs due for a check, most urgent first
+
+        Returns:
+            Tuple of (due blogs, number of blogs skipped)
+        """
+        now = now or time.time()
+        due = []
+        for blog in blogs:
+            schedule = self.load(blog['url'])
+            if schedule.get('next_due', 0) <= now + self.slack:
+                due.append((self.urgency(schedule, now), blog))
+
+        due.sort(key=lambda item: item[0], reverse=True)
+        if self.max_per_run:
+            due = due[:self.max_per_run]
+        selected = [blog for _, blog in due]
+        return selected, len(blogs) - len(selected)
+
+    def due_pages(self, pages, counts, now=None, on_skip=None):
+        """
+        Stream the due blogs out of pages of blogs, most urgent first within each page
+
+        With max_per_run set, the most urgent blogs of all pages are kept in
+        a heap of that size and yielded as one page after the last, so
+        memory follows max_per_run rather than the number of blogs.
+
+        Args:
+            pages: Iterable of lists of blogs
+            counts: Dictionary whose 'skipped' count is increased by blogs not due
+            on_skip: Called with each blog that is passed over
+        """
+        now = now or time.time()
+        counts.setdefault('skipped', 0)
+        if not self.max_per_run:
+            for page in pages:
+                due, skipped = self.select_due(page, now=now)
+                counts['skipped'] += skipped
+                if on_skip is not None and skipped:
+                    kept = {id(blog) for blog in due}
+                    for blog in page:
+                        if id(blog) not in kept:
+                            on_skip(blog)
+                if due:
+                    yield due
+            return
+
+        # Min-heap on urgency, so the least urgent kept blog is the one pushed out
+        heap = []
+        order = itertools.count()
+        for page in pages:
+            for blog in page:
+                schedule = self.load(blog['url'])
+                if schedule.get('next_due', 0) > now + self.slack:
+                    counts['skipped'] += 1
+                    if on_skip is not None:
+                        on_skip(blog)
+                    continue
+                item = (self.urgency(schedule, now), next(order), blog)
+                if len(heap) < self.max_per_run:
+                    heapq.heappush(heap, item)
+                else:
+                    pushed_out = heapq.heappushpop(heap, item)
+                    counts['skipped'] += 1
+                    if on_skip is not None:
+                        on_skip(pushed_out[2])
+        if heap:
+            yield [blog for _, _, blog in sorted(heap, key=lambda item: (-item[0], item[1]))]
+
+    def rate_interval(self, post_times, now):
+        """
+        Half the mean gap between recent posts
+
+        The gap runs up to now, so a blog that has gone quiet slows down
+        even though its old posts were frequent. One prior gap worth
+        default_interval is mixed in, so a blog with few known posts starts
+        near the default instead of swinging to either limit.
+        """
+        span = max(now - post_times[0], 0) if post_times else 0
+        mean_gap = (span + 2 * self.default_interval) / (len(post_times) + 1)
+        return mean_gap / 2
+
+    def record(self, blog_url, posts, new_posts, now=None):
+        """
+        Record the outcome of a check and schedule the next one
+
+        Args:
+            posts: Posts currently on the blog, or None if the server said not modified
+            new_posts: Posts found to be new by this check
+        """
+        now = now or time.time()
+        schedule = self.load(blog_url)
+
+        post_times = set(schedule.get('post_times', []))
+        for post in posts or []:
+            published = published_timestamp(post.get('published'))
+            if published is not None and published <= now:
+                post_times.add(int(published))
+        # Posts without a date count from when they were detected
+        for post in new_posts:
+            if published_timestamp(post.get('published')) is None:
+                post_times.add(int(now))
+        post_times = sorted(post_times)[-MAX_POST_TIMES:]
+
+        unchanged = 0 if new_posts else schedule.get('unchanged', 0) + 1
+        interval = self.rate_interval(post_times, now)
+        interval *= min(self.backoff ** min(unchanged, 32), self.max_backoff)
+        interval = int(min(max(interval, self.min_interval), self.max_interval))
+
+        self.cache_store.put(blog_url, 'schedule', {
+            'post_times': post_times,
+            'unchanged': unchanged,
+            'interval': interval,
+            'last_checked': int(now),
+            'next_due': int(now) + interval
+        })
+        return interval
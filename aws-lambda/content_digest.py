@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Content Digest
+Hash of a response body with the parts that change on every request
+removed, so a blog whose server sends no ETag/Last-Modified can still be
+recognised as unchanged before it is parsed
+"""
+
+import re
+import hashlib
+
+# Only content the post extractors never read is removed: comments,
+# script bodies, nonce/CSRF attributes, hidden inputs and asset versions.
+HTML_VOLATILE = (
+    (re.compile(rb'<!--.*?-->', re.S), b''),
+    (re.compile(rb'(<script\b[^>]*>).*?(</script\s*>)', re.S | re.I), rb'\1\2'),
+    (re.compile(rb'\s(?:nonce|data-nonce|data-csrf|data-token|data-timestamp)\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s>]+)', re.I), b''),
+    (re.compile(rb'<meta\b[^>]*\bname\s*=\s*["\']?csrf[^>]*>', re.I), b''),
+    (re.compile(rb'<input\b[^>]*\btype\s*=\s*["\']?hidden\b[^>]*>', re.I), b''),
+    (re.compile(rb'(<(?:link|script)\b[^>]*?[?&]ver=)[^"\'&\s>]*', re.I), rb'\1'),
+)
+
+# Feed-level build times, which some servers set to the time of the request
+FEED_HEADER_VOLATILE = (
+    (re.compile(rb'<!--.*?-->', re.S), b''),
+    (re.compile(rb'<((?:\w+:)?(?:lastBuildDate|pubDate|updated|date))\b[^>]*>.*?</\1\s*>', re.S | re.I), b''),
+)
+
+FIRST_ENTRY = re.compile(rb'<(?:\w+:)?(?:item|entry)[\s>]', re.I)
+
+
+def normalise_html(content):
+    for pattern, replacement in HTML_VOLATILE:
+        content = pattern.sub(replacement, content)
+    return content
+
+
+def normalise_feed(content):
+    """Drop comments and build dates from the part of the feed before its first entry"""
+    match = FIRST_ENTRY.search(content)
+    cut = match.start() if match else len(content)
+    header = content[:cut]
+    for pattern, replacement in FEED_HEADER_VOLATILE:
+        header = pattern.sub(replacement, header)
+    return header + content[cut:]
+
+
+def body_digest(content, kind):
+    """
+    Hex digest of a response body after normalisation
+
+    Args:
+        content: Response body bytes
+        kind: 'feed' or 'html'
+    """
+    normalised = normalise_feed(content) if kind == 'feed' else normalise_html(content)
+    return hashlib.blake2b(normalised, digest_size=16).hexdigest()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Fan-out Orchestration
+Splits a run over many worker invocations of the blog monitor handler.
+Workers are dispatched either as asynchronous Lambda invocations or
+in-process for offline runs and tests. Either way each worker leaves its
+summary and digest posts in a FanInStore, and the last one to finish adds
+them up and sends one digest per user for the whole run.
+"""
+
+import os
+import gzip
+import json
+import time
+import uuid
+import random
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from blog_source import iter_active_blog_pages
+from metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# Summary counts added up across workers
+SUMMARY_COUNTS = ('checked', 'updated', 'failed', 'skipped', 'rows_written', 'posts_written', 'batches_sent', 'emails_sent', 'emails_failed',
+                  'throttled', 'host_wait_seconds')
+
+
+class WorkerError(Exception):
+    """A worker invocation failed or returned an error response"""
+
+
+class FanInConflict(Exception):
+    """The run record kept changing under a worker's conditional write"""
+
+
+class FanInStore:
+    """
+    Results of the workers of one fan-out run, kept in a storage backend.
+
+    The coordinator records the run's shards with start(). Each worker
+    saves its summary and digest posts with save_result(), then adds its
+    shard to the run record with a conditional write in report(). Only the
+    write that completes the record returns True, so exactly one worker
+    (or the coordinator, for shards it failed to dispatch) goes on to add
+    everything up. Objects are left in the backend; expire them with a
+    lifecycle rule.
+    """
+
+    def __init__(self, backend, run_id, max_workers=None, write_attempts=None):
+        self.backend = backend
+        self.run_id = run_id
+        self.max_workers = max_workers or int(os.environ.get('CACHE_IO_WORKERS', '16'))
+        # Every worker of a run reports into one record, so allow for contention
+        self.write_attempts = write_attempts or int(os.environ.get('FANIN_WRITE_ATTEMPTS', '50'))
+
+    def key(self, name):
+        return f"{self.run_id}/{name}.json.gz"
+
+    def encode(self, value):
+        return gzip.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+    def read(self, name):
+        data = self.backend.get(self.key(name))
+        return json.loads(gzip.decompress(data).decode('utf-8')) if data else None
+
+    def start(self, shard_blog_counts):
+        """Record a new run with the number of blogs in each shard"""
+        self.backend.put(self.key('run'), self.encode({'blogs': shard_blog_counts, 'reported': []}))
+
+    def save_result(self, shard, summary, digest_posts):
+        self.backend.put(self.key(f"result-{shard}"), self.encode({'summary': summary, 'digest': digest_posts}))
+
+    def report(self, shard):
+        """
+        Mark a shard's result as saved
+
+        Returns:
+            True for the one call that completes the run, False otherwise
+
+        Raises:
+            FanInConflict: if the run record changed under every attempt
+        """
+        for attempt in range(self.write_attempts):
+            data, version = self.backend.get_versioned(self.key('run'))
+            run = json.loads(gzip.decompress(data).decode('utf-8'))
+            if shard in run['reported']:
+                return False
+            run['reported'].append(shard)
+            if self.backend.put_if(self.key('run'), self.encode(run), version):
+                return len(run['reported']) == len(run['blogs'])
+            time.sleep(random.uniform(0, 0.05 * 2 ** min(attempt, 5)))
+        raise FanInConflict(f"Run {self.run_id} record kept changing over {self.write_attempts} attempts")
+
+    def add_up(self, digest=None):
+        """
+        Add up every saved result, merging digest posts into digest
+
+        Shards without a result count all their blogs as failed.
+
+        Returns:
+            Summary dictionary with the usual counts plus shards and shards_failed
+        """
+        run = self.read('run')
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda shard: self.read(f"result-{shard}"), range(len(run['blogs']))))
+
+        summary = dict.fromkeys(SUMMARY_COUNTS, 0)
+        summary['shards'] = len(run['blogs'])
+        summary['shards_failed'] = 0
+        for blog_count, result in zip(run['blogs'], results):
+            if result is None:
+                summary['shards_failed'] += 1
+                summary['failed'] += blog_count
+                continue
+            if result['summary'].get('dispatch_failed'):
+                summary['shards_failed'] += 1
+            for count in SUMMARY_COUNTS:
+                summary[count] += result['summary'].get(count, 0)
+            if digest is not None:
+                digest.merge(result['digest'])
+        return summary
+
+    def save_summary(self, summary):
+        self.backend.put(self.key('summary'), self.encode(summary))
+
+    def load_summary(self):
+        """The run's totals once it has been added up, else None"""
+        return self.read('summary')
+
+
+def new_run_id():
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def read_response(response):
+    """Return the summary body of a handler response, raising WorkerError on failure"""
+    if not isinstance(response, dict) or response.get('statusCode') != 200:
+        raise WorkerError(f"Worker returned an error: {response}")
+    return json.loads(response['body'])
+
+
+class LocalDispatcher:
+    """Runs worker events through a handler function in this process"""
+
+    def __init__(self, handler, max_workers=None):
+        self.handler = handler
+        self.max_workers = max_workers or int(os.environ.get('FANOUT_CONCURRENCY', '4'))
+
+    def invoke(self, event):
+        return read_response(self.handler(event, None))
+
+    def dispatch(self, events):
+        """
+        Run every event concurrently
+
+        Returns:
+            List of (summary, error) tuples in event order
+        """
+        return dispatch_all(self.invoke, events, self.max_workers)
+
+
+class LambdaInvokeDispatcher:
+    """
+    Queues worker events as asynchronous (Event) invocations of a Lambda function
+
+    Each worker gets its own Lambda timeout and nothing comes back through
+    the invoke response, so no summary is returned for a worker.
+    """
+
+    def __init__(self, lambda_client, function_name, max_workers=None):
+        self.lambda_client = lambda_client
+        self.function_name = function_name
+        self.max_workers = max_workers or int(os.environ.get('FANOUT_CONCURRENCY', '10'))
+
+    def invoke(self, event):
+        response = self.lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='Event',
+            Payload=json.dumps(event).encode('utf-8')
+        )
+        if response.get('StatusCode') != 202:
+            raise WorkerError(f"Worker invocation was not queued: {response.get('StatusCode')}")
+        return None
+
+    def dispatch(self, events):
+        """
+        Queue one invocation per event, concurrently
+
+        Returns:
+            List of (None, error) tuples in event order
+        """
+        return dispatch_all(self.invoke, events, self.max_workers)
+
+
+def dispatch_all(invoke, events, max_workers):
+    if not events:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(invoke, event) for event in events]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+
+def load_active_blog_index(supabase_client, page_size=None):
+    """Page through the ids and URLs of active admin_blogs, ordered by id"""
+    page_size = page_size or int(os.environ.get('FANOUT_PAGE_SIZE', '1000'))
+    blogs = []
+    for page in iter_active_blog_pages(supabase_client, page_size=page_size, columns='id, url'):
+        blogs.extend(page)
+    return blogs
+
+
+def plan_shards(blogs, cache_store, shard_size):
+    """
+    Split blogs into worker shards of at most shard_size blogs
+
+    The number of workers follows the number of blogs, not the number of
+    cache shards. Blogs are ordered by cache shard before splitting, so each
+    worker touches only a few cache shards; workers sharing one at the
+    boundaries are safe because shard writes are conditional.
+
+    Returns:
+        List of {'blog_ids': [...], 'cache_shards': [...]} dictionaries
+    """
+    ordered = sorted((cache_store.shard_for(blog['url']), str(blog['id']), blog['id']) for blog in blogs)
+    shards = []
+    for start in range(0, len(ordered), shard_size):
+        chunk = ordered[start:start + shard_size]
+        shards.append({
+            'blog_ids': [blog_id for _, _, blog_id in chunk],
+            'cache_shards': sorted({cache_shard for cache_shard, _, _ in chunk})
+        })
+    return shards
+
+
+class FanOutCoordinator:
+    """
+    Plans worker shards for all active blogs and dispatches them.
+
+    Workers write their posts but leave their digest posts and summary in
+    a FanInStore on results_backend. Whoever completes the run calls
+    on_complete with the store, which adds the results up and sends one
+    digest per user. With in-process workers that happens before run()
+    returns, so its summary carries the totals; Lambda workers are only
+    queued, and the totals are logged and emitted by the last of them.
+    """
+
+    def __init__(self, supabase_client, dispatcher, cache_store, results_backend, on_complete=None,
+                 shard_size=None, metrics=None):
+        self.supabase = supabase_client
+        self.dispatcher = dispatcher
+        self.cache_store = cache_store
+        self.results_backend = results_backend
+        self.on_complete = on_complete or (lambda fan_in: fan_in.save_summary(fan_in.add_up()))
+        self.shard_size = shard_size or int(os.environ.get('FANOUT_SHARD_SIZE', '200'))
+        self.metrics = metrics or RunMetrics(enabled=False)
+
+    def worker_events(self, shards, run_id):
+        return [{
+            'mode': 'worker',
+            'run_id': run_id,
+            'shard': index,
+            'blog_ids': shard['blog_ids'],
+            'cache_shards': shard['cache_shards']
+        } for index, shard in enumerate(shards)]
+
+    def run(self):
+        """
+        Dispatch every shard of a new fan-out run
+
+        Returns:
+            Summary dictionary with run_id, shards, shards_dispatched and
+            shards_failed, plus the run's totals if it already finished
+        """
+        # Shards are planned from the stored layout, so a mismatch must stop the run
+        self.cache_store.check_layout()
+        with self.metrics.timer('blog_index_ms'):
+            blogs = load_active_blog_index(self.supabase)
+        with self.metrics.timer('plan_ms'):
+            shards = plan_shards(blogs, self.cache_store, self.shard_size)
+        self.metrics.count('blogs', len(blogs))
+        logger.info(f"Dispatching {len(blogs)} blogs in {len(shards)} shards")
+
+        summary = dict.fromkeys(SUMMARY_COUNTS, 0)
+        summary['shards'] = len(shards)
+        summary['shards_dispatched'] = 0
+        summary['shards_failed'] = 0
+        if not shards:
+            return summary
+
+        fan_in = FanInStore(self.results_backend, new_run_id())
+        fan_in.start([len(shard['blog_ids']) for shard in shards])
+        summary['run_id'] = fan_in.run_id
+
+        events = self.worker_events(shards, fan_in.run_id)
+        with self.metrics.timer('dispatch_ms'):
+            results = self.dispatcher.dispatch(events)
+        for event, (_, error) in zip(events, results):
+            if error is None:
+                summary['shards_dispatched'] += 1
+                continue
+            logger.error(f"Shard {event['shard']} failed: {str(error)}")
+            summary['shards_failed'] += 1
+            # Report the shard ourselves so the run can still finish without it
+            fan_in.save_result(event['shard'], {'failed': len(event['blog_ids']), 'dispatch_failed': 1}, {})
+            if fan_in.report(event['shard']):
+                self.on_complete(fan_in)
+
+        totals = fan_in.load_summary()
+        if totals:
+            for count in SUMMARY_COUNTS:
+                summary[count] = totals.get(count, 0)
+            summary['shards_failed'] = totals.get('shards_failed', summary['shards_failed'])
+        return summary
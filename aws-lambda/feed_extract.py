@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Bounded Feed Parsing
+Stream-scans an RSS/Atom document with expat, cuts it after the first N
+entries and hands only that prefix to feedparser, so big feeds are never
+normalised and sanitised past the entries we keep. The same scan can run
+over a download as it arrives, to stop reading at the cut.
+"""
+
+import os
+import xml.parsers.expat
+
+# Entry elements of RSS 0.9x/1.0/2.0 and Atom, by local name
+ENTRY_TAGS = ('item', 'entry')
+
+# Feed-level containers whose <title> must be seen before the cut
+FEED_TAGS = ('channel', 'feed')
+
+SCAN_CHUNK_SIZE = 64 * 1024
+
+
+class _CutFound(Exception):
+    """Raised from the expat handlers once the cut point is known"""
+
+
+def local_name(name):
+    return name.rsplit(':', 1)[-1]
+
+
+class FeedScanner:
+    """
+    Finds where a feed can be cut after its max_entries-th entry while its
+    bytes are still arriving, so a download can stop there
+
+    feed() is given the document chunk by chunk and returns True once the
+    cut point is known. Documents that cannot safely be cut (malformed,
+    not ASCII-compatible, feed title after the entries) make the scanner
+    give up, with done set and cut left as None.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        self.stack = []
+        self.entries = 0
+        self.entry_depth = None
+        self.feed_title = False
+        self.offset = 0
+        self.chunk = b''
+        self.cut = None
+        self.closing = None
+        self.done = False
+
+    def start_element(self, name, attrs):
+        tag = local_name(name)
+        if tag == 'title' and self.stack and local_name(self.stack[-1]) in FEED_TAGS:
+            self.feed_title = True
+        if tag in ENTRY_TAGS and self.entry_depth is None:
+            self.entry_depth = len(self.stack)
+        self.stack.append(name)
+
+    def end_element(self, name):
+        self.stack.pop()
+        if self.entry_depth != len(self.stack):
+            return
+        self.entry_depth = None
+        self.entries += 1
+        if self.entries >= self.max_entries:
+            # The end tag's '>' is always in the chunk being parsed
+            start = max(self.parser.CurrentByteIndex - self.offset, 0)
+            end = self.chunk.find(b'>', start)
+            if end >= 0:
+                self.cut = self.offset + end + 1
+            raise _CutFound()
+
+    def feed(self, chunk):
+        """Scan the next chunk of the document; returns True once it can be cut"""
+        if self.done:
+            return self.cut is not None
+        # Byte offsets assume an ASCII-compatible encoding
+        if self.offset < 4 and b'\x00' in chunk[:4 - self.offset]:
+            self.done = True
+            return False
+
+        self.chunk = chunk
+        try:
+            self.parser.Parse(chunk, False)
+        except _CutFound:
+            self.done = True
+            closing = ''.join(f"</{name}>" for name in reversed(self.stack))
+            # Feed metadata after the entries would be lost by cutting
+            if self.cut is None or not self.feed_title or not closing.isascii():
+                self.cut = None
+                return False
+            self.closing = closing.encode('ascii')
+            return True
+        except xml.parsers.expat.ExpatError:
+            self.done = True
+            return False
+        finally:
+            self.offset += len(chunk)
+            self.chunk = b''
+        return False
+
+    def truncate(self, content):
+        """The document's prefix up to the cut, with every still-open element closed again"""
+        return content[:self.cut] + self.closing
+
+
+def truncate_feed(content, max_entries):
+    """
+    Cut a feed document after its max_entries-th entry
+
+    Returns:
+        The prefix with every still-open element closed again, or None when
+        the feed has no more than max_entries entries or cannot safely be cut
+    """
+    scanner = FeedScanner(max_entries)
+    for start in range(0, len(content), SCAN_CHUNK_SIZE):
+        if scanner.feed(content[start:start + SCAN_CHUNK_SIZE]):
+            return scanner.truncate(content)
+        if scanner.done:
+            break
+    return None
+
+
+class FeedParser:
+    """
+    Feed parsing in one of two modes, set by FEED_PARSE_MODE:
+
+    fast: feedparser only sees the first max_entries entries. Malformed
+          documents, unusual encodings and short feeds go to feedparser whole.
+    full: feedparser parses the whole document.
+    """
+
+    def __init__(self, mode=None, max_entries=None):
+        self.mode = mode or os.environ.get('FEED_PARSE_MODE', 'fast')
+        self.max_entries = max_entries or int(os.environ.get('FEED_MAX_ENTRIES', '10'))
+
+    def scanner(self):
+        """A FeedScanner for stopping a download after max_entries entries, or None in full mode"""
+        if self.mode != 'fast':
+            return None
+        return FeedScanner(self.max_entries)
+
+    def parse(self, content):
+        """Parse feed bytes into a feedparser result"""
+        # feedparser is slow to import; load it on the first feed, not at cold start
+        import feedparser
+        if self.mode == 'fast':
+            truncated = truncate_feed(content, self.max_entries)
+            if truncated is not None:
+                return feedparser.parse(truncated)
+        return feedparser.parse(content)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Host Rate Limiter
+Per-host politeness for blog fetches: token buckets keyed by domain,
+robots.txt Crawl-delay, Retry-After and adaptive backoff on 429/503
+"""
+
+import os
+import time
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+from body_reader import BodyReader
+from metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the host wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# Hosts tracked before idle ones are first pruned, and hosts kept in the wait ranking
+PRUNE_MIN_HOSTS = 1024
+MAX_RANKED_HOSTS = 100
+
+# Largest robots.txt read; anything bigger is not a robots file worth parsing
+ROBOTS_MAX_BYTES = 512 * 1024
+
+# Kept at module scope so every monitor in the process shares one budget per host
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+class HostBusy(Exception):
+    """Raised when a request would have to wait longer than max_wait for its host"""
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - (now or time.time()), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _HostState:
+    __slots__ = ('next_at', 'blocked_until', 'penalty', 'crawl_delay', 'robots_checked', 'lock')
+
+    def __init__(self):
+        self.next_at = 0.0
+        self.blocked_until = 0.0
+        self.penalty = 1.0
+        self.crawl_delay = 0.0
+        self.robots_checked = False
+        self.lock = threading.Lock()
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host: `rate` requests per second with bursts of up to
+    `burst`. The spacing between requests to a host is the longest of
+    1/rate, its robots.txt Crawl-delay and any backoff in force, and no
+    request is sent before a Retry-After has passed.
+
+    Each 429/503 doubles the host's backoff penalty (up to max_penalty) and
+    every successful response halves it again.
+
+    Hosts not asked for idle_seconds and not blocked are forgotten whenever
+    the number tracked doubles, so the limiter stays small however many
+    blogs a long-lived process checks.
+    """
+
+    # Counters reported per run as differences between two stats() calls
+    COUNTERS = ('requests', 'waited', 'wait_seconds', 'throttled', 'rejected')
+
+    def __init__(self, key_func=None, session=None, user_agent='*', rate=None, burst=None,
+                 max_wait=None, max_penalty=None, crawl_delay=None, idle_seconds=None):
+        self.key_func = key_func or (lambda url: urlsplit(url).netloc.lower())
+        self.session = session
+        self.user_agent = user_agent
+        self.rate = rate or float(os.environ.get('HOST_RATE_LIMIT', '2'))
+        self.burst = burst or int(os.environ.get('HOST_BURST', '4'))
+        # Longest a request may wait for its host before failing with HostBusy
+        self.max_wait = max_wait or float(os.environ.get('HOST_MAX_WAIT', '60'))
+        self.max_penalty = max_penalty or float(os.environ.get('HOST_MAX_PENALTY', '32'))
+        if crawl_delay is None:
+            crawl_delay = os.environ.get('HONOUR_CRAWL_DELAY', 'true').lower() == 'true'
+        self.honour_crawl_delay = crawl_delay
+        self.idle_seconds = idle_seconds or float(os.environ.get('HOST_IDLE_SECONDS', '300'))
+
+        self._hosts = {}
+        self._prune_at = PRUNE_MIN_HOSTS
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+                       'throttled': 0, 'rejected': 0}
+        self._host_waits = {}
+        self.robots_reader = BodyReader(RunMetrics(enabled=False), max_bytes={'robots': ROBOTS_MAX_BYTES}, deadline=10)
+
+    def host_state(self, key):
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                if len(self._hosts) >= self._prune_at:
+                    self.prune(time.monotonic())
+                state = self._hosts[key] = _HostState()
+            return state
+
+    def prune(self, now):
+        """Forget idle hosts and all but the top of the wait ranking; called with _lock held"""
+        for key, state in list(self._hosts.items()):
+            if state.next_at <= now - self.idle_seconds and state.blocked_until <= now:
+                del self._hosts[key]
+        if len(self._host_waits) > MAX_RANKED_HOSTS:
+            ranked = sorted(self._host_waits.items(), key=lambda item: item[1], reverse=True)
+            self._host_waits = dict(ranked[:MAX_RANKED_HOSTS])
+        self._prune_at = max(2 * len(self._hosts), PRUNE_MIN_HOSTS)
+
+    def load_crawl_delay(self, url, state):
+        """Read the host's robots.txt Crawl-delay once, as one of the host's requests"""
+        parts = urlsplit(url)
+        robots_url = f"{parts.scheme}://{parts.netloc}/robots.txt"
+        # Only the slot is taken under the lock; the host's other requests
+        # must not queue behind the wait and the fetch
+        with state.lock:
+            if state.robots_checked:
+                return
+            state.robots_checked = True
+            if not self.honour_crawl_delay or self.session is None:
+                return
+            try:
+                wait = self.reserve(self.key_func(url), state)
+            except HostBusy as e:
+                logger.info(f"Could not read {robots_url}: {str(e)}")
+                return
+
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            response = self.session.get(robots_url, timeout=5, headers={'User-Agent': self.user_agent}, verify=False, stream=True)
+            if response.status_code != 200:
+                response.close()
+                return
+            content = self.robots_reader.read(response, 'robots')
+            parser = RobotFileParser()
+            parser.parse(content.decode('utf-8', 'replace').splitlines())
+            delay = parser.crawl_delay(self.user_agent)
+            if delay:
+                with state.lock:
+                    state.crawl_delay = float(delay)
+                logger.info(f"Using Crawl-delay {delay}s for {parts.netloc}")
+        except Exception as e:
+            logger.info(f"Could not read {robots_url}: {str(e)}")
+
+    def interval(self, state):
+        return max(1.0 / self.rate, state.crawl_delay) * state.penalty
+
+    def reserve(self, key, state):
+        """
+        Take the next slot in a host's bucket; called with state.lock held
+
+        Returns:
+            Seconds until the slot comes up
+
+        Raises:
+            HostBusy: if the wait would be longer than max_wait
+        """
+        now = time.monotonic()
+        interval = self.interval(state)
+        # next_at may run up to (burst - 1) intervals behind now, which is the bucket's capacity
+        start = max(now, state.blocked_until, state.next_at - (self.burst - 1) * interval)
+        wait = start - now
+        if wait > self.max_wait:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HostBusy(f"{key} is rate limited for another {wait:.0f}s")
+        state.next_at = max(state.next_at, start) + interval
+        with self._lock:
+            self._stats['requests'] += 1
+        return wait
+
+    def acquire(self, url):
+        """
+        Wait until a request to url's host is allowed
+
+        Returns:
+            Seconds waited
+
+        Raises:
+            HostBusy: if the wait would be longer than max_wait
+        """
+        key = self.key_func(url)
+        state = self.host_state(key)
+        # Crawl-delay only matters from a host's second request on, so hosts
+        # we ask once per run never cost an extra robots.txt fetch
+        if state.next_at and not state.robots_checked:
+            self.load_crawl_delay(url, state)
+
+        with state.lock:
+            wait = self.reserve(key, state)
+
+        with self._lock:
+            if wait > 0:
+                self._stats['waited'] += 1
+                self._stats['wait_seconds'] += wait
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], wait)
+                self._host_waits[key] = self._host_waits.get(key, 0.0) + wait
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, url, response):
+        """
+        Adapt a host's pace to a response
+
+        Returns:
+            Seconds until the host may be asked again if the response was a
+            429/503, else None
+        """
+        state = self.host_state(self.key_func(url))
+        with state.lock:
+            if response.status_code not in THROTTLE_STATUSES:
+                state.penalty = max(state.penalty / 2, 1.0)
+                return None
+
+            state.penalty = min(state.penalty * 2, self.max_penalty)
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = self.interval(state)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+
+        with self._lock:
+            self._stats['throttled'] += 1
+        logger.info(f"{self.key_func(url)} answered {response.status_code}, backing off {delay:.0f}s")
+        return delay
+
+    def stats(self):
+        """Counters plus the hosts with the most time spent waiting"""
+        with self._lock:
+            stats = dict(self._stats)
+            busiest = sorted(self._host_waits.items(), key=lambda item: item[1], reverse=True)[:10]
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['max_wait_seconds'] = round(stats['max_wait_seconds'], 3)
+        stats['busiest_hosts'] = [{'host': host, 'wait_seconds': round(wait, 3)} for host, wait in busiest]
+        return stats
+
+
+def stats_delta(before, after):
+    """Counters accumulated between two stats() snapshots"""
+    return {name: round(after[name] - before[name], 3) for name in HostRateLimiter.COUNTERS}
+
+
+def get_rate_limiter(key_func=None, session=None, user_agent='*'):
+    """Get the process-wide rate limiter, creating it on first use"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = HostRateLimiter(key_func=key_func, session=session, user_agent=user_agent)
+    return _limiter
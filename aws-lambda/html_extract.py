@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Streaming HTML Post Extractor
+Single-pass HTMLParser replacement for the BeautifulSoup post extraction in
+BlogMonitor.parse_html_content. It keeps no document tree, bounds the text it
+collects and stops parsing as soon as the result can no longer change.
+
+The output matches BeautifulSoup(html, 'html.parser') + soup.select(): the
+tree-building rules of bs4's html.parser builder are reproduced here (void
+elements, unmatched end tags, whitespace-only strings, ruby/template strings).
+
+learn_profile() works out which selector, headings and link suit a site, and
+apply_profile() extracts with only that combination on later runs.
+"""
+
+from html.parser import HTMLParser
+from html.entities import html5 as HTML5_ENTITIES
+import html
+
+# Elements parse_html_content strips before looking for posts
+REMOVED_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'aside'])
+
+# bs4 gives strings inside these their own string class, so they only show up
+# in the get_text() of an element of the same name
+STRING_CONTAINER_TAGS = frozenset(['rt', 'rp', 'template'])
+
+# Whitespace inside these is kept verbatim by bs4
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+
+# bs4's empty-element tags for HTML: closed as soon as they open
+VOID_TAGS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+    'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+    'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr'
+])
+
+TITLE_TAGS = frozenset(['h1', 'h2', 'h3'])
+
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# Same order as the original BeautifulSoup selector list; the first selector
+# with any match wins
+POST_SELECTORS = [
+    'article',
+    '.post',
+    '.entry',
+    '.blog-post',
+    '[class*="post"]',
+    'main article',
+    '.content article'
+]
+
+
+class StopParsing(Exception):
+    """Raised inside the parser once the result is final"""
+
+
+def compile_selector(selector):
+    """
+    Compile one of the simple selectors used for post containers into a
+    predicate on (tag, attrs, ancestors). Supports tag names, .class,
+    [attr*="value"] and a single descendant combinator.
+    """
+    parts = selector.split()
+    if len(parts) == 2:
+        ancestor_match = compile_selector(parts[0])
+        element_match = compile_selector(parts[1])
+        return lambda tag, attrs, stack: element_match(tag, attrs, stack) and any(
+            ancestor_match(entry.tag, entry.attrs, ()) for entry in stack
+        )
+
+    if selector.startswith('.'):
+        class_name = selector[1:]
+        return lambda tag, attrs, stack: class_name in (attrs.get('class') or '').split()
+
+    if selector.startswith('[') and '*=' in selector:
+        name, value = selector[1:-1].split('*=')
+        value = value.strip('"\'')
+        return lambda tag, attrs, stack: value in (attrs.get(name) or '')
+
+    return lambda tag, attrs, stack: tag == selector
+
+
+class _Entry:
+    __slots__ = ('tag', 'attrs', 'candidates', 'is_title')
+
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        self.attrs = attrs
+        self.candidates = None
+        self.is_title = False
+
+
+class _Candidate:
+    """Text, title and link being collected for one matched post container"""
+
+    __slots__ = ('selector', 'text_kind', 'parts', 'length', 'overflow', 'title_parts',
+                 'title_entry', 'title_tag', 'link', 'link_in_title', 'closed')
+
+    def __init__(self, selector, text_kind):
+        self.selector = selector
+        self.text_kind = text_kind
+        self.parts = []
+        self.length = 0
+        self.overflow = False
+        self.title_parts = None
+        self.title_entry = None
+        self.title_tag = None
+        self.link = None
+        self.link_in_title = False
+        self.closed = False
+
+
+class PostExtractor(HTMLParser):
+    """
+    Streaming extractor for the post containers of a blog index page
+
+    Args:
+        selectors: Post container selectors, in priority order
+        title_tags: Heading tags a post title is taken from
+        link_in_title: Only take the post link from inside its title heading
+        learn: Collect matches for every selector instead of only the winner
+    """
+
+    def __init__(self, selectors=None, limit=10, content_limit=500, title_tags=None,
+                 link_in_title=False, learn=False):
+        super().__init__(convert_charrefs=False)
+        self.selectors = [compile_selector(selector) for selector in (selectors or POST_SELECTORS)]
+        self.limit = limit
+        self.content_limit = content_limit
+        self.title_tags = frozenset(title_tags) if title_tags else TITLE_TAGS
+        self.link_in_title = link_in_title
+        self.learn = learn
+
+        self.stack = []
+        self.open_counts = {}
+        self.removed_depth = 0
+        self.containers = []
+        self.preserve_depth = 0
+        self.data = []
+        self.closed_void_tags = {}
+
+        self.matches = [[] for _ in self.selectors]
+        self.best = None
+        self.active = []
+
+        self.page_title_parts = None
+        self.page_title_entry = None
+        self.page_title_done = False
+
+    # -- text handling ----------------------------------------------------
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        character = HTML5_ENTITIES.get(name + ';')
+        self.data.append(character if character is not None else '&%s' % name)
+
+    def handle_charref(self, name):
+        self.data.append(html.unescape('&#%s;' % name))
+
+    def end_data(self, cdata=False):
+        """Dispatch the text gathered since the last markup event"""
+        if not self.data:
+            return
+        text = ''.join(self.data)
+        self.data = []
+
+        if not self.preserve_depth and not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+
+        if self.removed_depth:
+            return
+
+        # bs4 keeps CDATA sections as CData even inside rt/rp/template
+        kind = self.containers[-1] if self.containers and not cdata else None
+        if kind is None and self.page_title_entry is not None:
+            self.page_title_parts.append(text)
+
+        for candidate in self.active:
+            if kind is None and candidate.title_entry is not None:
+                candidate.title_parts.append(text)
+            if candidate.text_kind == kind and not candidate.overflow:
+                candidate.parts.append(text)
+                candidate.length += len(text)
+                if candidate.length > self.content_limit:
+                    self.check_overflow(candidate)
+
+    def check_overflow(self, candidate):
+        """Stop collecting once the stripped text is known to exceed the limit"""
+        text = ''.join(candidate.parts).lstrip()
+        candidate.parts = [text]
+        candidate.length = len(text)
+        if len(text) > self.content_limit and text[self.content_limit:].strip():
+            candidate.overflow = True
+
+    def handle_comment(self, data):
+        self.end_data()
+
+    def handle_decl(self, decl):
+        self.end_data()
+
+    def handle_pi(self, data):
+        self.end_data()
+
+    def unknown_decl(self, data):
+        self.end_data()
+        if data.upper().startswith('CDATA['):
+            self.data.append(data[len('CDATA['):])
+            self.end_data(cdata=True)
+
+    # -- tree handling ----------------------------------------------------
+
+    def handle_startendtag(self, tag, attrs):
+        self.start_element(tag, attrs)
+        self.end_element(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self.start_element(tag, attrs)
+        if tag in VOID_TAGS:
+            self.end_element(tag)
+            # A later explicit end tag for it is ignored
+            self.closed_void_tags[tag] = self.closed_void_tags.get(tag, 0) + 1
+
+    def handle_endtag(self, tag):
+        if self.closed_void_tags.get(tag):
+            self.closed_void_tags[tag] -= 1
+        else:
+            self.end_element(tag)
+
+    def start_element(self, tag, attrs):
+        self.end_data()
+        attr_dict = {}
+        for key, value in attrs:
+            attr_dict[key] = value if value is not None else ''
+
+        entry = _Entry(tag, attr_dict)
+        if self.removed_depth or tag in REMOVED_TAGS:
+            self.push(entry)
+            return
+
+        for candidate in self.active:
+            if tag in self.title_tags and candidate.title_parts is None:
+                candidate.title_parts = []
+                candidate.title_entry = entry
+                candidate.title_tag = tag
+            if tag == 'a' and candidate.link is None:
+                in_title = candidate.title_entry is not None
+                if in_title or not self.link_in_title:
+                    candidate.link = attr_dict.get('href', '')
+                    candidate.link_in_title = in_title
+
+        if tag == 'title' and self.page_title_parts is None:
+            self.page_title_parts = []
+            self.page_title_entry = entry
+            entry.is_title = True
+
+        last = len(self.selectors) if self.best is None or self.learn else self.best + 1
+        for index in range(last):
+            if len(self.matches[index]) >= self.limit:
+                continue
+            if self.selectors[index](tag, attr_dict, self.stack):
+                self.add_candidate(entry, index)
+
+        self.push(entry)
+
+    def add_candidate(self, entry, index):
+        candidate = _Candidate(index, entry.tag if entry.tag in STRING_CONTAINER_TAGS else None)
+        self.matches[index].append(candidate)
+        if entry.candidates is None:
+            entry.candidates = []
+        entry.candidates.append(candidate)
+        self.active.append(candidate)
+
+        if self.best is None or index < self.best:
+            self.best = index
+            # Lower priority selectors can no longer win; stop feeding them
+            if not self.learn:
+                self.active = [active for active in self.active if active.selector <= index]
+
+    def push(self, entry):
+        self.stack.append(entry)
+        self.open_counts[entry.tag] = self.open_counts.get(entry.tag, 0) + 1
+        if entry.tag in REMOVED_TAGS:
+            self.removed_depth += 1
+        if entry.tag in STRING_CONTAINER_TAGS:
+            self.containers.append(entry.tag)
+        if entry.tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+
+    def pop(self):
+        entry = self.stack.pop()
+        self.open_counts[entry.tag] -= 1
+        if entry.tag in REMOVED_TAGS:
+            self.removed_depth -= 1
+        if entry.tag in STRING_CONTAINER_TAGS:
+            self.containers.pop()
+        if entry.tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth -= 1
+
+        if entry.is_title:
+            self.page_title_entry = None
+            self.page_title_done = True
+
+        for candidate in self.active:
+            if candidate.title_entry is entry:
+                candidate.title_entry = None
+
+        if entry.candidates:
+            for candidate in entry.candidates:
+                candidate.closed = True
+            self.active = [candidate for candidate in self.active if not candidate.closed]
+
+    def end_element(self, tag):
+        self.end_data()
+        # Like bs4, an end tag with no matching open element is ignored
+        if not self.open_counts.get(tag):
+            return
+        while True:
+            entry = self.stack[-1]
+            self.pop()
+            if entry.tag == tag:
+                break
+
+        if self.is_complete():
+            raise StopParsing()
+
+    def is_complete(self):
+        """True once the top selector has all its posts and the page title is known"""
+        if self.learn or self.best != 0 or not self.page_title_done:
+            return False
+        matches = self.matches[0]
+        return len(matches) >= self.limit and all(candidate.closed for candidate in matches)
+
+    def finish(self):
+        """Close everything still open, as bs4 does at the end of the document"""
+        self.end_data()
+        while self.stack:
+            self.pop()
+
+    # -- results ----------------------------------------------------------
+
+    def build_post(self, candidate, url):
+        if candidate.title_parts is not None:
+            title = ''.join(candidate.title_parts).strip()
+        else:
+            title = 'No Title'
+
+        link = candidate.link or ''
+        if link and not link.startswith('http'):
+            link = url.rstrip('/') + '/' + link.lstrip('/')
+
+        content = ''.join(candidate.parts)
+        if candidate.overflow:
+            content = content.lstrip()[:self.content_limit] + '...'
+        else:
+            content = content.strip()
+            if len(content) > self.content_limit:
+                content = content[:self.content_limit] + '...'
+
+        return {
+            'title': title,
+            'link': link,
+            'content': content,
+            'published': ''
+        }
+
+    def posts_for(self, index, url):
+        return [self.build_post(candidate, url) for candidate in self.matches[index][:self.limit]]
+
+    def result(self, url):
+        posts = self.posts_for(self.best, url) if self.best is not None else []
+
+        return {
+            'title': ''.join(self.page_title_parts) if self.page_title_parts is not None else 'Blog',
+            'description': '',
+            'link': url,
+            'posts': posts
+        }
+
+
+def run_extractor(extractor, html_text):
+    try:
+        extractor.feed(html_text)
+        extractor.close()
+    except StopParsing:
+        pass
+    extractor.finish()
+    return extractor
+
+
+def extract_html_posts(html_text, url, selectors=None, limit=10, content_limit=500):
+    """
+    Extract up to `limit` posts from a blog page
+
+    Returns:
+        Dictionary with 'title', 'description', 'link' and 'posts', in the
+        same shape as BlogMonitor.parse_html_content
+    """
+    extractor = PostExtractor(selectors, limit, content_limit)
+    return run_extractor(extractor, html_text).result(url)
+
+
+def score_posts(posts):
+    """Number of distinct posts with both a title and a link"""
+    return len(set(
+        post['link'] for post in posts
+        if post['link'] and post['title'] and post['title'] != 'No Title'
+    ))
+
+
+def apply_profile(html_text, url, profile, limit=10, content_limit=500):
+    """Extract posts using only the selector, heading and link rule of a learned profile"""
+    extractor = PostExtractor(
+        [profile['selector']], limit, content_limit,
+        title_tags=profile['titles'],
+        link_in_title=profile.get('link') == 'heading'
+    )
+    return run_extractor(extractor, html_text).result(url)
+
+
+def learn_profile(html_text, url, limit=10, content_limit=500):
+    """
+    Find the selector whose matches give the most titled, linked posts, and
+    the headings and link element those posts use
+
+    Returns:
+        Tuple of (profile, blog_data). profile is None when no selector finds
+        a usable post; blog_data is then the plain extract_html_posts result.
+    """
+    extractor = run_extractor(PostExtractor(None, limit, content_limit, learn=True), html_text)
+
+    best_index, best_score = None, 0
+    for index in range(len(POST_SELECTORS)):
+        score = score_posts(extractor.posts_for(index, url))
+        # Ties go to the earlier, more specific selector
+        if score > best_score:
+            best_index, best_score = index, score
+    if best_index is None:
+        return None, extractor.result(url)
+
+    candidates = extractor.matches[best_index][:limit]
+    linked = [candidate for candidate in candidates if candidate.link]
+    profile = {
+        'selector': POST_SELECTORS[best_index],
+        'titles': sorted(set(candidate.title_tag for candidate in candidates if candidate.title_tag)),
+        'link': 'heading' if all(candidate.link_in_title for candidate in linked) else 'first'
+    }
+
+    blog_data = apply_profile(html_text, url, profile, limit, content_limit)
+    if not score_posts(blog_data['posts']):
+        return None, extractor.result(url)
+    return profile, blog_data
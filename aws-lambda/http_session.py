@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Session
+Keep-alive connection pools with retry, reused across warm Lambda invocations
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Kept at module scope so warm invocations reuse open connections
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session(pool_connections=None, pool_maxsize=None, retries=None, backoff_factor=None):
+    """
+    Build a requests session with per-host keep-alive pools and retry with backoff
+
+    Args:
+        pool_connections: Number of hosts to keep a connection pool for
+        pool_maxsize: Connections kept open per host
+        retries: Retries for connection errors and 5xx responses
+        backoff_factor: Exponential backoff factor between retries, in seconds
+    """
+    pool_connections = pool_connections or int(os.environ.get('HTTP_POOL_CONNECTIONS', '100'))
+    pool_maxsize = pool_maxsize or int(os.environ.get('HTTP_POOL_MAXSIZE', '20'))
+    if retries is None:
+        retries = int(os.environ.get('HTTP_RETRIES', '2'))
+    if backoff_factor is None:
+        backoff_factor = float(os.environ.get('HTTP_BACKOFF_FACTOR', '0.5'))
+
+    # Connection failures are retried for every method; 5xx only for idempotent ones.
+    # 429/503 and Retry-After are left to the host rate limiter, which paces the whole host
+    # rather than sleeping inside one request for as long as the server asks
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 504),
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    """Get the process-wide shared session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
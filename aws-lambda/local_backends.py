@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Local Backends
+Offline stand-ins for the Supabase and S3 clients: Supabase tables as JSON
+rows in SQLite and S3 objects as files, implementing only the calls the
+monitor makes, so a worker can run without any cloud services
+"""
+
+import os
+import json
+import uuid
+import threading
+from pathlib import Path
+
+from local_store import connect
+
+# Columns the monitor filters on, indexed in every table
+INDEXED_COLUMNS = ('id', 'url', 'blog_id', 'link', 'source_url')
+
+
+def column_path(column):
+    if not column.replace('_', '').isalnum():
+        raise ValueError(f"Unsupported column name: {column}")
+    return f"json_extract(data, '$.{column}')"
+
+
+def sql_value(value):
+    # JSON booleans come back from json_extract as 1/0
+    return int(value) if isinstance(value, bool) else value
+
+
+class LocalResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class LocalQuery:
+    """
+    The subset of the postgrest query builder the monitor uses: select,
+    eq/in_/gt/gte/lte filters, order, limit, update, insert and upsert
+    with on_conflict/ignore_duplicates
+    """
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.filters = []
+        self.payload = None
+        self.options = {}
+        self.order_by = None
+        self.row_limit = None
+
+    def select(self, columns='*', **kwargs):
+        self.operation = 'select'
+        self.columns = columns
+        return self
+
+    def filter(self, op, column, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self.filter('=', column, value)
+
+    def gt(self, column, value):
+        return self.filter('>', column, value)
+
+    def gte(self, column, value):
+        return self.filter('>=', column, value)
+
+    def lte(self, column, value):
+        return self.filter('<=', column, value)
+
+    def in_(self, column, values):
+        return self.filter('in', column, list(values))
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def update(self, payload):
+        self.operation = 'update'
+        self.payload = payload
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.operation = 'insert'
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self.operation = 'upsert'
+        self.payload = payload
+        self.options = kwargs
+        return self
+
+    def where(self):
+        """WHERE clause and parameters for the filters"""
+        clauses, params = ['tbl = ?'], [self.table]
+        for op, column, value in self.filters:
+            if op == 'in':
+                if not value:
+                    clauses.append('0')
+                    continue
+                clauses.append(f"{column_path(column)} IN ({', '.join('?' * len(value))})")
+                params.extend(sql_value(item) for item in value)
+            else:
+                clauses.append(f"{column_path(column)} {op} ?")
+                params.append(sql_value(value))
+        return ' AND '.join(clauses), params
+
+    def matching_rows(self):
+        where, params = self.where()
+        sql = f"SELECT rowid, data FROM documents WHERE {where}"
+        if self.order_by:
+            sql += f" ORDER BY {column_path(self.order_by[0])} {'DESC' if self.order_by[1] else 'ASC'}"
+        if self.row_limit is not None:
+            sql += ' LIMIT ?'
+            params.append(self.row_limit)
+        return [(rowid, json.loads(data)) for rowid, data in self.client.connection.execute(sql, params)]
+
+    def execute(self):
+        with self.client.lock, self.client.connection:
+            if self.operation == 'select':
+                rows = [row for _, row in self.matching_rows()]
+                if self.columns != '*':
+                    columns = [column.strip() for column in self.columns.split(',')]
+                    rows = [{column: row.get(column) for column in columns} for row in rows]
+                return LocalResult(rows)
+
+            if self.operation == 'update':
+                rows = []
+                for rowid, row in self.matching_rows():
+                    row.update(self.payload)
+                    self.client.connection.execute('UPDATE documents SET data = ? WHERE rowid = ?', (json.dumps(row), rowid))
+                    rows.append(row)
+                return LocalResult(rows)
+
+            return LocalResult(self.write())
+
+    def write(self):
+        conflict = [column.strip() for column in self.options.get('on_conflict', '').split(',') if column.strip()]
+        written = []
+        for row in self.payload if isinstance(self.payload, list) else [self.payload]:
+            row = dict(row)
+            row.setdefault('id', str(uuid.uuid4()))
+            if self.operation == 'upsert' and conflict:
+                existing = LocalQuery(self.client, self.table)
+                for column in conflict:
+                    existing.eq(column, row.get(column))
+                match = existing.limit(1).matching_rows()
+                if match:
+                    if self.options.get('ignore_duplicates'):
+                        continue
+                    rowid, current = match[0]
+                    row = dict(current, **{key: value for key, value in row.items() if key != 'id'})
+                    self.client.connection.execute('UPDATE documents SET data = ? WHERE rowid = ?', (json.dumps(row), rowid))
+                    written.append(row)
+                    continue
+            self.client.connection.execute('INSERT INTO documents (tbl, data) VALUES (?, ?)', (self.table, json.dumps(row)))
+            written.append(row)
+        return written
+
+
+class LocalSupabase:
+    """
+    Supabase client stand-in keeping every table as JSON rows in one SQLite
+    file. Only the calls the monitor makes are supported; there are no
+    constraints, defaults (apart from id) or row level security.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS documents (tbl TEXT NOT NULL, data TEXT NOT NULL)')
+        for column in INDEXED_COLUMNS:
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS documents_{column} ON documents (tbl, {column_path(column)})"
+            )
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class LocalS3Client:
+    """S3 client stand-in storing each object as a file under root/bucket/key"""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def object_path(self, bucket, key):
+        path = (self.root / bucket / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Key escapes the bucket: {key}")
+        return path
+
+    def get_object(self, Bucket, Key):
+        path = self.object_path(Bucket, Key)
+        if not path.exists():
+            raise self.exceptions.NoSuchKey(Key)
+        return {'Body': LocalBody(path.read_bytes())}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self.object_path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a crash never leaves a half-written object
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(Body.encode('utf-8') if isinstance(Body, str) else Body)
+        os.replace(tmp_path, path)
+        return {}
+
+
+class LocalBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
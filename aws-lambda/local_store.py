@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Local SQLite Store
+Per-blog cache entries and a durable job queue of due blog checks in
+SQLite files, for running the monitor as a long-lived local worker.
+Both are for a single worker process per data directory.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from notification_digest import NotificationDigest, DIGEST_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path):
+    """Open a SQLite database shared between threads, in WAL mode"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class SQLiteCacheStore:
+    """
+    Drop-in for ShardedCacheStore keeping each (key, field) as a row in SQLite.
+
+    Nothing is held in memory: get() reads the row and put() writes it in
+    an open transaction, which flush() commits. Changes of a run that dies
+    before flush() are rolled back, like unflushed shards.
+
+    The open transaction holds the database's write lock from the first
+    change until flush(), i.e. for most of a worker cycle, so the store is
+    for one process only; threads within it share the connection.
+
+    The digest table holds posts waiting for the next notification digest,
+    written in the same transaction so they are committed with the cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' key TEXT NOT NULL,'
+            ' field TEXT NOT NULL,'
+            ' value,'
+            ' PRIMARY KEY (key, field))'
+        )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS digest ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' blog_url TEXT NOT NULL,'
+            ' post TEXT NOT NULL)'
+        )
+        self.connection.commit()
+        self._changes = 0
+        self._lock = threading.Lock()
+
+    def check_layout(self):
+        """Rows are keyed by blog, so there is no layout to check"""
+
+    def load_all(self, shards=None):
+        """Nothing to preload; rows are read as they are used"""
+
+    def prefetch(self, keys):
+        """Nothing to preload; rows are read as they are used"""
+
+    def hold(self, keys):
+        """Nothing is kept in memory, so there is nothing to hold"""
+
+    def release(self, key):
+        """Nothing is kept in memory, so there is nothing to evict"""
+
+    def get(self, key, field, default=None):
+        """Get a cached value for a blog"""
+        with self._lock:
+            row = self.connection.execute('SELECT value FROM cache WHERE key = ? AND field = ?', (key, field)).fetchone()
+        if row is None or row[0] is None:
+            return default
+        return json.loads(row[0])
+
+    def put(self, key, field, value):
+        """Set a cached value for a blog, to be committed by the next flush()"""
+        self.write(key, field, json.dumps(value, ensure_ascii=False, sort_keys=True))
+
+    def get_bytes(self, key, field):
+        with self._lock:
+            row = self.connection.execute('SELECT value FROM cache WHERE key = ? AND field = ?', (key, field)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return bytes(row[0])
+
+    def put_bytes(self, key, field, data):
+        self.write(key, field, sqlite3.Binary(data))
+
+    def write(self, key, field, value):
+        with self._lock:
+            cursor = self.connection.execute(
+                'INSERT INTO cache (key, field, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (key, field) DO UPDATE SET value = excluded.value WHERE value IS NOT excluded.value',
+                (key, field, value)
+            )
+            self._changes += cursor.rowcount
+
+    def pending_digest_posts(self):
+        """Committed digest posts, as (blog_url, post) tuples in the order they were added"""
+        with self._lock:
+            rows = self.connection.execute('SELECT blog_url, post FROM digest ORDER BY id').fetchall()
+        return [(blog_url, json.loads(post)) for blog_url, post in rows]
+
+    def add_digest_posts(self, blog_url, posts):
+        """Record posts for the next digest, to be committed by the next flush()"""
+        with self._lock:
+            self.connection.executemany(
+                'INSERT INTO digest (blog_url, post) VALUES (?, ?)',
+                [(blog_url, json.dumps(post, ensure_ascii=False)) for post in posts]
+            )
+
+    def clear_digest_posts(self):
+        """Drop the recorded digest posts once the next flush() commits"""
+        with self._lock:
+            self.connection.execute('DELETE FROM digest')
+
+    def flush(self):
+        """
+        Commit every change since the last flush
+
+        Returns:
+            Number of rows changed
+        """
+        with self._lock:
+            self.connection.commit()
+            changes, self._changes = self._changes, 0
+        return changes
+
+    def close(self):
+        with self._lock:
+            self.connection.rollback()
+            self.connection.close()
+
+
+class PersistentDigest(NotificationDigest):
+    """
+    NotificationDigest whose pending posts are kept in a SQLiteCacheStore.
+
+    Posts added between digests are committed with the cache, before their
+    jobs are finished, and loaded back when a worker starts, so a crash
+    between digests does not lose them. send() drops them in the open
+    transaction, which commits only after the emails were sent.
+    """
+
+    def __init__(self, supabase_client, mailer, cache_store, **kwargs):
+        super().__init__(supabase_client, mailer, **kwargs)
+        self.cache_store = cache_store
+        for blog_url, post in cache_store.pending_digest_posts():
+            self._posts_by_blog.setdefault(blog_url, []).append(post)
+
+    def add(self, blog, new_posts):
+        super().add(blog, new_posts)
+        self.cache_store.add_digest_posts(blog['url'], [
+            {field: post.get(field, '') for field in DIGEST_FIELDS} for post in new_posts
+        ])
+
+    def send(self):
+        self.cache_store.clear_digest_posts()
+        return super().send()
+
+
+class SQLiteJobQueue:
+    """
+    Durable queue of blog checks: one row per active blog with the time its
+    next check is due.
+
+    claim() leases due jobs to this worker for lease_seconds, so a worker
+    that dies never loses them; they come due again once the lease runs
+    out. finish() records each check's outcome and next due time, and
+    release() hands back jobs that were claimed but never started.
+
+    Leases only protect against a crashed worker: the queue is for one
+    process, and two processes claiming from it are not supported.
+    """
+
+    def __init__(self, path, lease_seconds=None, retry_base=None, retry_max=None):
+        self.path = path
+        self.lease_seconds = lease_seconds or int(os.environ.get('WORKER_LEASE_SECONDS', '1800'))
+        # Failed checks are retried after retry_base seconds, doubling up to retry_max
+        self.retry_base = retry_base or int(os.environ.get('WORKER_RETRY_BASE', '60'))
+        self.retry_max = retry_max or int(os.environ.get('WORKER_RETRY_MAX', '3600'))
+        self.connection = connect(path)
+        self.connection.executescript(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' blog_id PRIMARY KEY,'
+            ' url TEXT NOT NULL,'
+            ' due_at REAL NOT NULL,'
+            ' leased_until REAL NOT NULL DEFAULT 0,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' last_error TEXT,'
+            ' generation INTEGER NOT NULL DEFAULT 0);'
+            'CREATE INDEX IF NOT EXISTS jobs_due_at ON jobs (due_at);'
+        )
+        self.connection.commit()
+        self._lock = threading.Lock()
+
+    def sync(self, pages, now=None):
+        """
+        Make the queue hold exactly the given blogs
+
+        New blogs are due straight away and blogs no longer listed are
+        dropped, unless a worker holds them. Pages are applied as they are
+        read, so the blog list is never held in memory.
+
+        Args:
+            pages: Iterable of lists of {'id', 'url'} rows
+
+        Returns:
+            Tuple of (jobs added, jobs removed)
+        """
+        now = now or time.time()
+        with self._lock:
+            generation = self.connection.execute('SELECT COALESCE(MAX(generation), 0) + 1 FROM jobs').fetchone()[0]
+            before = self.connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        for page in pages:
+            with self._lock, self.connection:
+                self.connection.executemany(
+                    'INSERT INTO jobs (blog_id, url, due_at, generation) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (blog_id) DO UPDATE SET url = excluded.url, generation = excluded.generation',
+                    [(blog['id'], blog['url'], now, generation) for blog in page]
+                )
+        with self._lock, self.connection:
+            removed = self.connection.execute(
+                'DELETE FROM jobs WHERE generation < ? AND leased_until <= ?', (generation, now)
+            ).rowcount
+            after = self.connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        return after - before + removed, removed
+
+    def claim(self, limit, now=None):
+        """
+        Lease up to limit due jobs, earliest due first
+
+        Returns:
+            List of blogs as {'id', 'url'} dictionaries
+        """
+        now = now or time.time()
+        with self._lock, self.connection:
+            rows = self.connection.execute(
+                'SELECT blog_id, url FROM jobs WHERE due_at <= ? AND leased_until <= ? ORDER BY due_at LIMIT ?',
+                (now, now, limit)
+            ).fetchall()
+            self.connection.executemany(
+                'UPDATE jobs SET leased_until = ? WHERE blog_id = ?',
+                [(now + self.lease_seconds, blog_id) for blog_id, _ in rows]
+            )
+        return [{'id': blog_id, 'url': url} for blog_id, url in rows]
+
+    def finish(self, outcomes, now=None):
+        """
+        Record finished checks and end their leases
+
+        Args:
+            outcomes: List of (blog id, next due time, error or None); failed
+                      checks are retried with backoff instead of at next due
+        """
+        now = now or time.time()
+        with self._lock, self.connection:
+            for blog_id, next_due, error in outcomes:
+                if error is None:
+                    self.connection.execute(
+                        'UPDATE jobs SET due_at = ?, leased_until = 0, attempts = 0, last_error = NULL WHERE blog_id = ?',
+                        (next_due, blog_id)
+                    )
+                    continue
+                attempts = (self.connection.execute('SELECT attempts FROM jobs WHERE blog_id = ?', (blog_id,)).fetchone() or (0,))[0]
+                retry_in = min(self.retry_base * 2 ** min(attempts, 16), self.retry_max)
+                self.connection.execute(
+                    'UPDATE jobs SET due_at = ?, leased_until = 0, attempts = attempts + 1, last_error = ? WHERE blog_id = ?',
+                    (now + retry_in, str(error)[:500], blog_id)
+                )
+
+    def release(self, blog_ids):
+        """End the leases of claimed jobs that were never started, leaving them due"""
+        with self._lock, self.connection:
+            self.connection.executemany('UPDATE jobs SET leased_until = 0 WHERE blog_id = ?', [(blog_id,) for blog_id in blog_ids])
+
+    def next_due_in(self, now=None):
+        """Seconds until the next job is due (0 when one is due now), or None when the queue is empty"""
+        now = now or time.time()
+        with self._lock:
+            row = self.connection.execute('SELECT MIN(MAX(due_at, leased_until)) FROM jobs').fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - now, 0.0)
+
+    def stats(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            total, due, leased, failing = self.connection.execute(
+                'SELECT COUNT(*), SUM(due_at <= ? AND leased_until <= ?), SUM(leased_until > ?), SUM(attempts > 0) FROM jobs',
+                (now, now, now)
+            ).fetchone()
+        return {'jobs': total, 'due': due or 0, 'leased': leased or 0, 'failing': failing or 0}
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Local Worker
+Runs the blog monitor as a long-lived process on our own machines: due
+blogs come from a durable SQLite job queue, checks run on a worker pool with
+the Lambda monitor's logic, and per-blog state stays in a local SQLite
+store between checks.
+
+Usage:
+    python local_worker.py [--data-dir ./monitor-data] [--once] [--add-blog URL ...]
+
+Run one worker per data directory; its SQLite cache and queue are not
+shared between processes.
+
+WORKER_BACKEND=local (the default) keeps admin_blogs, blog_posts etc. in
+data-dir/supabase.db and S3 objects under data-dir/s3, so the worker runs
+fully offline. WORKER_BACKEND=remote uses Supabase and S3 from the same
+environment variables as the Lambda function.
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+from blog_monitor import configure_process
+from blog_runner import ConcurrentBlogRunner
+from blog_source import iter_active_blog_pages, CheckedBlogMarker
+from blog_monitor_lambda import LambdaBlogMonitor, get_supabase_client, get_s3_client
+from local_store import SQLiteCacheStore, SQLiteJobQueue, PersistentDigest
+from metrics import RunMetrics
+
+logger = logging.getLogger(__name__)
+
+# Summary counts logged per cycle
+CYCLE_COUNTS = ('checked', 'updated', 'failed', 'rows_written', 'posts_written', 'emails_sent', 'emails_failed')
+
+
+def create_backends(data_dir, backend=None):
+    """
+    Supabase client, S3 client and cache bucket for the worker
+
+    Returns:
+        Tuple of (supabase client, s3 client, bucket name)
+    """
+    backend = backend or os.environ.get('WORKER_BACKEND', 'local')
+    if backend == 'remote':
+        return get_supabase_client(), get_s3_client(), os.environ['CACHE_BUCKET_NAME']
+
+    from local_backends import LocalSupabase, LocalS3Client
+    return LocalSupabase(str(Path(data_dir) / 'supabase.db')), LocalS3Client(Path(data_dir) / 's3'), 'local-cache'
+
+
+class LocalWorker:
+    """
+    Pulls due blogs from the job queue and checks them in cycles of up to
+    batch_size blogs.
+
+    Jobs are claimed a few at a time as pool threads free up. After each
+    cycle the worker writes queued posts, sends queued emails, commits the
+    cache and only then records the cycle's jobs as done, so a crash at
+    any point leads to blogs being checked again rather than posts being
+    lost. Digests collect across cycles and go out every digest_interval;
+    with a PersistentDigest their posts are committed with the cache too.
+
+    stop() lets the checks in flight finish, hands unstarted jobs back to
+    the queue and ends the loop after the cycle's writes.
+    """
+
+    def __init__(self, monitor, supabase_client, job_queue, batch_size=None, claim_size=None,
+                 poll_interval=None, sync_interval=None, check_interval=None, digest_interval=None):
+        self.monitor = monitor
+        self.supabase = supabase_client
+        self.queue = job_queue
+        self.batch_size = batch_size or int(os.environ.get('WORKER_BATCH_SIZE', '200'))
+        self.claim_size = claim_size or int(os.environ.get('WORKER_CLAIM_SIZE', '16'))
+        # Longest idle wait between looks at the queue
+        self.poll_interval = poll_interval or float(os.environ.get('WORKER_POLL_INTERVAL', '30'))
+        # How often the queue is synced with the active admin_blogs
+        self.sync_interval = sync_interval or float(os.environ.get('WORKER_SYNC_INTERVAL', '300'))
+        # Time between checks of a blog when adaptive scheduling is off, and the floor when it is on
+        self.check_interval = check_interval or float(os.environ.get('WORKER_CHECK_INTERVAL', str(24 * 3600)))
+        self.digest_interval = digest_interval or float(os.environ.get('WORKER_DIGEST_INTERVAL', '3600'))
+        self.stopping = threading.Event()
+        self.runner = ConcurrentBlogRunner(monitor)
+        self._next_sync_at = 0.0
+        self._next_digest_at = time.monotonic() + self.digest_interval
+
+    def stop(self):
+        self.stopping.set()
+
+    def sync(self):
+        """Add newly active blogs to the queue and drop inactive ones"""
+        try:
+            added, removed = self.queue.sync(iter_active_blog_pages(self.supabase))
+            logger.info(f"Synced job queue: {added} blogs added, {removed} removed, {self.queue.stats()}")
+        except Exception as e:
+            logger.error(f"Error syncing job queue: {str(e)}")
+        self._next_sync_at = time.monotonic() + self.sync_interval
+
+    def claimed_jobs(self):
+        """Claim due jobs a few at a time, as the runner takes them, until the batch is full or we stop"""
+        taken = 0
+        while taken < self.batch_size and not self.stopping.is_set():
+            jobs = self.queue.claim(min(self.claim_size, self.batch_size - taken))
+            if not jobs:
+                return
+            for index, job in enumerate(jobs):
+                if self.stopping.is_set():
+                    self.queue.release([unstarted['id'] for unstarted in jobs[index:]])
+                    return
+                taken += 1
+                yield job
+
+    def next_due(self, blog, now):
+        """When a checked blog is next due: its schedule, but never sooner than the minimum interval"""
+        scheduler = self.monitor.scheduler
+        if scheduler is None:
+            return now + self.check_interval
+        next_due = scheduler.load(blog['url']).get('next_due') or 0
+        # A fetch that failed leaves the schedule untouched, so it may already be in the past
+        return max(next_due, now + scheduler.min_interval)
+
+    def run_cycle(self):
+        """
+        Check one batch of due blogs and write out everything it produced
+
+        Returns:
+            Summary dictionary for the cycle
+        """
+        monitor = self.monitor
+        before = {'rows_written': monitor.post_writer.stats['rows_written'],
+                  'posts_written': monitor.post_writer.stats['posts_written'],
+                  'emails_sent': monitor.mailer.stats['sent'], 'emails_failed': monitor.mailer.stats['failed']}
+        outcomes = []
+        checked_marker = CheckedBlogMarker(self.supabase, monitor.post_writer.id_chunk_size)
+
+        def on_complete(blog, error):
+            outcomes.append((blog['id'], self.next_due(blog, time.time()), error))
+            if error is None:
+                checked_marker.mark(blog['id'])
+
+        results = self.runner.run(self.claimed_jobs(), on_complete=on_complete)
+        if not outcomes:
+            return dict.fromkeys(CYCLE_COUNTS, 0)
+
+        # Posts first, then the cache holding their seen indexes, then the jobs
+        write_stats = monitor.post_writer.flush()
+        if monitor.digest is not None and (self.stopping.is_set() or time.monotonic() >= self._next_digest_at):
+            monitor.digest.send()
+            self._next_digest_at = time.monotonic() + self.digest_interval
+        email_stats = monitor.mailer.flush()
+        monitor.mailer.close()
+        checked_marker.flush()
+        monitor.cache_store.flush()
+        self.queue.finish(outcomes)
+
+        summary = dict(results)
+        summary['rows_written'] = write_stats['rows_written'] - before['rows_written']
+        summary['posts_written'] = write_stats['posts_written'] - before['posts_written']
+        summary['emails_sent'] = email_stats['sent'] - before['emails_sent']
+        summary['emails_failed'] = email_stats['failed'] - before['emails_failed']
+        logger.info(f"Cycle finished: {summary}")
+        return summary
+
+    def run(self, once=False):
+        """
+        Check due blogs until stop() is called
+
+        Args:
+            once: Return as soon as no blog is due instead of waiting for more
+        """
+        totals = dict.fromkeys(CYCLE_COUNTS, 0)
+        while not self.stopping.is_set():
+            if time.monotonic() >= self._next_sync_at:
+                self.sync()
+
+            summary = self.run_cycle()
+            for count in CYCLE_COUNTS:
+                totals[count] += summary[count]
+            if summary['checked'] + summary['failed']:
+                continue
+
+            due_in = self.queue.next_due_in()
+            if once and (due_in is None or due_in > 0):
+                break
+            wait = self.poll_interval if due_in is None else min(max(due_in, 1.0), self.poll_interval)
+            self.stopping.wait(wait)
+
+        # Posts found since the last digest still go out before exiting
+        if self.monitor.digest is not None:
+            self.monitor.digest.send()
+            email_stats = self.monitor.mailer.flush()
+            self.monitor.mailer.close()
+            # Commits the sent digest's removal from a PersistentDigest
+            self.monitor.cache_store.flush()
+            totals['emails_sent'] += email_stats['sent']
+        logger.info(f"Worker stopped: {totals}")
+        return totals
+
+
+def add_blogs(supabase_client, urls):
+    """Register blogs in admin_blogs, for seeding a local backend"""
+    existing = {row['url'] for row in supabase_client.table('admin_blogs').select('url').in_('url', urls).execute().data or []}
+    rows = [{'url': url, 'name': url, 'is_active': True} for url in urls if url not in existing]
+    if rows:
+        supabase_client.table('admin_blogs').insert(rows).execute()
+    logger.info(f"Added {len(rows)} blogs to admin_blogs")
+
+
+def install_signal_handlers(worker):
+    """Stop the worker gracefully on SIGTERM/SIGINT; a second signal exits at once"""
+    def handle(signum, frame):
+        logger.info(f"Received signal {signum}, finishing checks in flight")
+        worker.stop()
+        signal.signal(signum, signal.SIG_DFL)
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the blog monitor as a long-lived local worker')
+    parser.add_argument('--data-dir', default=os.environ.get('WORKER_DATA_DIR', './monitor-data'), help='Directory for the SQLite store, queue and local backends')
+    parser.add_argument('--once', action='store_true', help='Exit once no blog is due instead of waiting')
+    parser.add_argument('--add-blog', action='append', default=[], metavar='URL', help='Add a blog to admin_blogs before starting')
+    args = parser.parse_args(argv)
+
+    configure_process()
+    data_dir = Path(args.data_dir)
+    supabase_client, s3_client, bucket = create_backends(data_dir)
+    if args.add_blog:
+        add_blogs(supabase_client, args.add_blog)
+
+    cache_store = SQLiteCacheStore(str(data_dir / 'cache.db'))
+    job_queue = SQLiteJobQueue(str(data_dir / 'queue.db'))
+    # EMF output is for CloudWatch; the worker logs a summary per cycle instead
+    monitor = LambdaBlogMonitor(supabase_client, s3_client, bucket, cache_store=cache_store, metrics=RunMetrics(enabled=False))
+    if monitor.digest is not None:
+        # Posts waiting for the next digest must survive a restart like the cache
+        monitor.digest = PersistentDigest(supabase_client, monitor.mailer, cache_store)
+
+    worker = LocalWorker(monitor, supabase_client, job_queue)
+    install_signal_handlers(worker)
+    try:
+        worker.run(once=args.once)
+    finally:
+        cache_store.close()
+        job_queue.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
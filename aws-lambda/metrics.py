@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Run Metrics
+Timers, counters and latency histograms for one run, written at the end as a
+single CloudWatch Embedded Metric Format (EMF) JSON document
+"""
+
+import os
+import json
+import math
+import time
+import random
+import threading
+
+# Largest number of values CloudWatch accepts for one metric in an EMF document
+EMF_MAX_VALUES = 100
+
+PERCENTILES = (50, 90, 99)
+
+
+class _NullTimer:
+    """Timer handed out when metrics are off; does nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted values"""
+    index = max(math.ceil(pct / 100.0 * len(values)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def metric_unit(name):
+    if name.endswith('_ms'):
+        return 'Milliseconds'
+    if name.endswith('_seconds'):
+        return 'Seconds'
+    if name.endswith('bytes') or name.startswith('bytes'):
+        return 'Bytes'
+    return 'Count'
+
+
+class RunMetrics:
+    """
+    Counters and histograms for one run, safe to share between threads.
+
+    Histogram names end in _ms for latencies, which timer() records. With
+    METRICS_ENABLED=false every call returns straight away and emit() writes
+    nothing.
+
+    Each histogram keeps an exact count, sum, min and max, and a uniform
+    sample of at most reservoir_size values for its percentiles, so a run
+    over any number of blogs holds the same amount of metrics data.
+    """
+
+    def __init__(self, enabled=None, namespace=None, dimensions=None, reservoir_size=None):
+        if enabled is None:
+            enabled = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+        self.enabled = enabled
+        self.namespace = namespace or os.environ.get('METRICS_NAMESPACE', 'BlogMonitor')
+        self.dimensions = dict(dimensions or {})
+        # Searchable fields of the document that are not metrics, such as a worker's shard
+        self.properties = {}
+        self.reservoir_size = reservoir_size or int(os.environ.get('METRICS_RESERVOIR_SIZE', '10000'))
+        self.counters = {}
+        # name -> sampled values, and name -> [count, sum, min, max] over every value
+        self.histograms = {}
+        self.totals = {}
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        """Context manager recording its block's duration in the histogram name"""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name)
+
+    def set_property(self, name, value):
+        """Add a field to the EMF document that is not published as a metric"""
+        with self._lock:
+            self.properties[name] = value
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                totals = self.totals[name] = [0, 0.0, value, value]
+            totals[0] += 1
+            totals[1] += value
+            totals[2] = min(totals[2], value)
+            totals[3] = max(totals[3], value)
+
+            values = self.histograms.setdefault(name, [])
+            if len(values) < self.reservoir_size:
+                values.append(value)
+            else:
+                # Reservoir sampling: every value so far is kept with equal probability
+                index = self._random.randrange(totals[0])
+                if index < self.reservoir_size:
+                    values[index] = value
+
+    def histogram_summary(self, values, totals=None):
+        values = sorted(values)
+        count, total, low, high = totals or (len(values), sum(values), values[0], values[-1])
+        summary = {'count': count, 'sum': round(total, 3), 'min': round(low, 3), 'max': round(high, 3)}
+        for pct in PERCENTILES:
+            summary[f"p{pct}"] = round(percentile(values, pct), 3)
+        return summary
+
+    def emf_values(self, values):
+        """
+        Histogram values for EMF, evenly spaced quantiles when there are too many
+
+        CloudWatch keeps the distribution's shape, so its percentile
+        statistics stay close to the exact ones reported alongside.
+        """
+        values = sorted(values)
+        if len(values) <= EMF_MAX_VALUES:
+            return [round(value, 3) for value in values]
+        step = len(values) / EMF_MAX_VALUES
+        return [round(values[int((i + 0.5) * step)], 3) for i in range(EMF_MAX_VALUES)]
+
+    def to_emf(self, counts=None):
+        """
+        Build the run's EMF document
+
+        Args:
+            counts: Extra numeric counts to publish, such as the run summary
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: list(values) for name, values in self.histograms.items() if values}
+            totals = {name: tuple(self.totals[name]) for name in histograms}
+            properties = dict(self.properties)
+
+        for name, value in (counts or {}).items():
+            if name in properties:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                counters.setdefault(name, value)
+
+        document = dict(self.dimensions)
+        document.update(properties)
+        document.update(counters)
+        for name, values in histograms.items():
+            document[name] = self.emf_values(values)
+        document['histograms'] = {name: self.histogram_summary(values, totals[name]) for name, values in histograms.items()}
+
+        names = sorted(counters) + sorted(histograms)
+        document['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': self.namespace,
+                'Dimensions': [sorted(self.dimensions)],
+                'Metrics': [{'Name': name, 'Unit': metric_unit(name)} for name in names]
+            }]
+        }
+        return document
+
+    def emit(self, counts=None):
+        """Write the EMF document to stdout, where Lambda hands it to CloudWatch"""
+        if not self.enabled:
+            return None
+        document = self.to_emf(counts)
+        print(json.dumps(document), flush=True)
+        return document
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Notification Digest
+Collects new posts from every blog checked in a run and sends each
+subscriber a single email covering all of their blogs
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Post fields used when rendering a digest
+DIGEST_FIELDS = ('title', 'link', 'published', 'summary')
+
+
+class NotificationDigest:
+    """
+    Groups new posts by user. Subscribers and their emails are looked up with
+    a few bulk queries when the digest is sent, not once per blog.
+    """
+
+    def __init__(self, supabase_client, mailer, chunk_size=None, url_chunk_size=None):
+        self.supabase = supabase_client
+        self.mailer = mailer
+        # Values go into the query string, so keep each in_() list short
+        self.chunk_size = chunk_size or int(os.environ.get('ID_CHUNK_SIZE', '200'))
+        # Blog URLs are much longer than ids, so fewer fit in one lookup
+        self.url_chunk_size = url_chunk_size or int(os.environ.get('LINK_CHUNK_SIZE', '50'))
+        self._posts_by_blog = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, blog, new_posts):
+        """Record new posts found on a blog during this run"""
+        with self._lock:
+            # Only the fields an email shows are kept until send()
+            self._posts_by_blog.setdefault(blog['url'], []).extend(
+                {field: post.get(field, '') for field in DIGEST_FIELDS} for post in new_posts
+            )
+
+    def export(self):
+        """Posts recorded so far by blog URL, for another digest to merge()"""
+        with self._lock:
+            return {blog_url: list(posts) for blog_url, posts in self._posts_by_blog.items()}
+
+    def merge(self, posts_by_blog):
+        """Add posts exported by another digest, such as a fan-out worker's"""
+        with self._lock:
+            for blog_url, posts in posts_by_blog.items():
+                self._posts_by_blog.setdefault(blog_url, []).extend(posts)
+
+    def chunks(self, values, size=None):
+        size = size or self.chunk_size
+        for start in range(0, len(values), size):
+            yield values[start:start + size]
+
+    def load_subscriptions(self, blog_urls):
+        """Map user_id to the list of blog URLs they follow, for the given URLs"""
+        subscriptions = OrderedDict()
+        for chunk in self.chunks(blog_urls, self.url_chunk_size):
+            response = self.supabase.table('blogs').select('user_id, url').in_('url', chunk).execute()
+            for user_blog in response.data or []:
+                subscriptions.setdefault(user_blog['user_id'], []).append(user_blog['url'])
+        return subscriptions
+
+    def load_emails(self, user_ids):
+        """Map user_id to email address with one profiles query per chunk"""
+        emails = {}
+        for chunk in self.chunks(user_ids):
+            response = self.supabase.table('profiles').select('id, email').in_('id', chunk).execute()
+            for profile in response.data or []:
+                if profile.get('email'):
+                    emails[profile['id']] = profile['email']
+        return emails
+
+    def render(self, blog_posts):
+        """
+        Render the digest for one user
+
+        Args:
+            blog_posts: List of (blog_url, new_posts) tuples
+        """
+        total = sum(len(posts) for _, posts in blog_posts)
+        if len(blog_posts) == 1:
+            subject = f"New Blog Posts: {blog_posts[0][0]} ({total} new)"
+        else:
+            subject = f"New Blog Posts: {total} new across {len(blog_posts)} blogs"
+
+        body = f"Number of new posts: {total}\n"
+        body += f"Detection time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+
+        for blog_url, posts in blog_posts:
+            body += f"New posts detected on {blog_url}\n" + "="*50 + "\n\n"
+            for i, post in enumerate(posts, 1):
+                body += f"{i}. {post['title']}\n"
+                if post.get('published'):
+                    body += f"   Published: {post['published']}\n"
+                if post.get('link'):
+                    body += f"   Link: {post['link']}\n"
+                if post.get('summary'):
+                    body += f"   Summary: {post['summary']}\n"
+                body += "\n" + "-"*40 + "\n\n"
+
+        return subject, body
+
+    def send(self):
+        """
+        Queue one digest email per subscriber on the mailer
+
+        Returns:
+            Number of digests queued
+        """
+        with self._lock:
+            posts_by_blog, self._posts_by_blog = self._posts_by_blog, OrderedDict()
+
+        if not posts_by_blog:
+            return 0
+
+        try:
+            subscriptions = self.load_subscriptions(list(posts_by_blog))
+            if not subscriptions:
+                logger.info("No users found for blogs with new posts")
+                return 0
+
+            emails = self.load_emails(list(subscriptions))
+            queued = 0
+            for user_id, blog_urls in subscriptions.items():
+                user_email = emails.get(user_id)
+                if not user_email:
+                    continue
+
+                blog_posts = [(url, posts_by_blog[url]) for url in dict.fromkeys(blog_urls)]
+                subject, body = self.render(blog_posts)
+                self.mailer.queue(user_email, subject, body)
+                queued += 1
+
+            logger.info(f"Queued {queued} digest emails covering {len(posts_by_blog)} blogs")
+            return queued
+
+        except Exception as e:
+            logger.error(f"Error sending notification digest: {str(e)}")
+            return 0
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Batched Blog Post Writer
+Collects blog_posts rows and subscriber last_checked updates during a run
+and writes them as chunked multi-row statements once each chunk fills up.
+In reference storage each post is written once to posts and subscribers
+get blog_posts rows pointing at it.
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class BlogPostWriter:
+    """
+    Buffers blog_posts rows and flushes them as chunked upserts.
+
+    Upserts use (blog_id, link) as the conflict target and ignore duplicates,
+    so rerunning a check never inserts the same post twice for a subscriber.
+    Shared posts likewise use (source_url, link) in posts.
+
+    POST_STORAGE picks how new posts are stored:
+      copy      - every subscriber gets a full blog_posts row (default)
+      reference - one posts row per post, and blog_posts rows without
+                  summary/content that reference it through post_id
+    """
+
+    def __init__(self, supabase_client, batch_size=None, id_chunk_size=None, storage=None):
+        self.supabase = supabase_client
+        self.batch_size = batch_size or int(os.environ.get('POST_BATCH_SIZE', '500'))
+        # Blog ids go into the query string, so keep each in_() list short
+        self.id_chunk_size = id_chunk_size or int(os.environ.get('ID_CHUNK_SIZE', '200'))
+        # Links are much longer than ids, so fewer fit in one lookup
+        self.link_chunk_size = int(os.environ.get('LINK_CHUNK_SIZE', '50'))
+        self.storage = storage or os.environ.get('POST_STORAGE', 'copy')
+        self._rows = []
+        self._shared = []
+        self._checked_blog_ids = []
+        self._lock = threading.Lock()
+        self.stats = {'rows_written': 0, 'batches_sent': 0, 'rows_failed': 0, 'blogs_marked_checked': 0, 'posts_written': 0}
+
+    def add_rows(self, rows):
+        """Queue blog_posts rows, flushing full batches as they fill up"""
+        with self._lock:
+            self._rows.extend(rows)
+            batches = []
+            while len(self._rows) >= self.batch_size:
+                batches.append(self._rows[:self.batch_size])
+                self._rows = self._rows[self.batch_size:]
+
+        for batch in batches:
+            self.write_batch(batch)
+
+    def add_shared_posts(self, entries):
+        """
+        Queue shared posts with the subscriber rows that will reference them
+
+        Args:
+            entries: List of (posts row, blog_posts rows without post_id) tuples
+        """
+        with self._lock:
+            self._shared.extend(entries)
+            batches = []
+            while len(self._shared) >= self.batch_size:
+                batches.append(self._shared[:self.batch_size])
+                self._shared = self._shared[self.batch_size:]
+
+        for batch in batches:
+            self.write_shared_batch(batch)
+
+    def mark_checked(self, blog_ids):
+        """Queue subscriber blogs whose last_checked should be bumped, writing full chunks as they fill up"""
+        with self._lock:
+            self._checked_blog_ids.extend(blog_ids)
+            chunks = []
+            while len(self._checked_blog_ids) >= self.id_chunk_size:
+                chunks.append(self._checked_blog_ids[:self.id_chunk_size])
+                self._checked_blog_ids = self._checked_blog_ids[self.id_chunk_size:]
+
+        for chunk in chunks:
+            self.write_checked(list(dict.fromkeys(chunk)))
+
+    def write_batch(self, rows):
+        """Upsert one chunk of blog_posts rows"""
+        try:
+            self.supabase.table('blog_posts').upsert(
+                rows,
+                on_conflict='blog_id,link',
+                ignore_duplicates=True,
+                returning='minimal'
+            ).execute()
+            with self._lock:
+                self.stats['rows_written'] += len(rows)
+                self.stats['batches_sent'] += 1
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(rows)} blog posts: {str(e)}")
+            with self._lock:
+                self.stats['rows_failed'] += len(rows)
+
+    def lookup_post_ids(self, posts):
+        """Map (source_url, link) to posts.id for the given posts rows"""
+        # Grouped by source so each lookup filters on the full (source_url, link) index
+        links_by_source = {}
+        for post in posts:
+            links_by_source.setdefault(post['source_url'], {})[post['link']] = None
+        post_ids = {}
+        for source_url, links in links_by_source.items():
+            links = list(links)
+            for start in range(0, len(links), self.link_chunk_size):
+                response = self.supabase.table('posts').select('id, link').eq('source_url', source_url).in_(
+                    'link', links[start:start + self.link_chunk_size]
+                ).execute()
+                for row in response.data or []:
+                    post_ids[(source_url, row['link'])] = row['id']
+        return post_ids
+
+    def write_shared_batch(self, entries):
+        """Write one chunk of shared posts, then queue their subscriber rows with post_id set"""
+        posts = [post for post, _ in entries]
+        try:
+            self.supabase.table('posts').upsert(
+                posts,
+                on_conflict='source_url,link',
+                ignore_duplicates=True,
+                returning='minimal'
+            ).execute()
+            # Posts already stored by an earlier run are skipped above, so ids come from a lookup
+            post_ids = self.lookup_post_ids(posts)
+        except Exception as e:
+            logger.error(f"Error writing batch of {len(posts)} shared posts: {str(e)}")
+            with self._lock:
+                self.stats['rows_failed'] += sum(len(references) for _, references in entries)
+            return
+
+        rows = []
+        missing = 0
+        for post, references in entries:
+            post_id = post_ids.get((post['source_url'], post['link']))
+            if post_id is None:
+                missing += len(references)
+                continue
+            rows.extend(dict(reference, post_id=post_id) for reference in references)
+
+        with self._lock:
+            self.stats['posts_written'] += len(posts)
+            self.stats['rows_failed'] += missing
+        if missing:
+            logger.error(f"{missing} subscriber rows lost their shared post")
+        self.add_rows(rows)
+
+    def write_checked(self, blog_ids):
+        """Bump last_checked for a chunk of subscriber blogs in one statement"""
+        now = datetime.now().isoformat()
+        try:
+            self.supabase.table('blogs').update({
+                'last_checked': now,
+                'updated_at': now
+            }).in_('id', blog_ids).execute()
+            with self._lock:
+                self.stats['blogs_marked_checked'] += len(blog_ids)
+        except Exception as e:
+            logger.error(f"Error updating last_checked for {len(blog_ids)} blogs: {str(e)}")
+
+    def flush(self):
+        """
+        Write everything still buffered
+
+        Returns:
+            Dictionary with rows written, batches sent and failure counts
+        """
+        # Shared posts go first, as they queue the subscriber rows referencing them
+        with self._lock:
+            shared, self._shared = self._shared, []
+        for start in range(0, len(shared), self.batch_size):
+            self.write_shared_batch(shared[start:start + self.batch_size])
+
+        with self._lock:
+            rows, self._rows = self._rows, []
+            blog_ids, self._checked_blog_ids = list(dict.fromkeys(self._checked_blog_ids)), []
+
+        for start in range(0, len(rows), self.batch_size):
+            self.write_batch(rows[start:start + self.batch_size])
+
+        for start in range(0, len(blog_ids), self.id_chunk_size):
+            self.write_checked(blog_ids[start:start + self.id_chunk_size])
+
+        return dict(self.stats)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Seen Post Index
+Compact per-blog record of every post already reported, stored as a
+sorted array of 64-bit hashes of the normalised GUID/link
+"""
+
+import os
+import sys
+import time
+import struct
+import hashlib
+from array import array
+from bisect import bisect_left
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Tracking parameters that change between feed fetches without changing the post
+TRACKING_PREFIXES = ('utm_',)
+TRACKING_PARAMS = ('fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref')
+
+
+def normalise_link(link):
+    """Lower-case scheme and host, drop fragments, tracking params and trailing slashes"""
+    parts = urlsplit(link.strip())
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PREFIXES) and key.lower() not in TRACKING_PARAMS
+    ]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+def post_keys(post):
+    """
+    Identities of a post: its GUID and its normalised link, or its title
+    when it has neither
+    """
+    keys = []
+    if post.get('guid'):
+        keys.append('guid:' + post['guid'].strip())
+    if post.get('link'):
+        keys.append('link:' + normalise_link(post['link']))
+    if not keys:
+        keys.append('title:' + post.get('title', '').strip().lower())
+    return keys
+
+
+def post_hashes(post):
+    """64-bit hashes of a post's identities"""
+    return [
+        int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        for key in post_keys(post)
+    ]
+
+
+class SeenPostIndex:
+    """
+    Sorted array of post hashes with a parallel array of last-seen times.
+
+    A post is stored under both its GUID and its link, so it is still
+    recognised if either one changes. Lookups are a binary search. The index
+    only grows by the posts added to it, and retention is bounded by entry
+    count and age, dropping the least recently seen entries first.
+    """
+
+    MAGIC = b'SPI1'
+    HEADER = struct.Struct('<4sI')
+    REFRESH_AFTER = 30 * 24 * 3600
+
+    def __init__(self, max_entries=None, max_age_days=None):
+        self.max_entries = max_entries or int(os.environ.get('SEEN_INDEX_MAX_ENTRIES', '5000'))
+        if max_age_days is None:
+            max_age_days = int(os.environ.get('SEEN_INDEX_MAX_AGE_DAYS', '730'))
+        self.max_age = max_age_days * 24 * 3600
+        self.hashes = array('Q')
+        self.seen_at = array('I')
+        self.changed = False
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, post):
+        return any(self.contains_hash(value) for value in post_hashes(post))
+
+    def contains_hash(self, value):
+        position = bisect_left(self.hashes, value)
+        return position < len(self.hashes) and self.hashes[position] == value
+
+    def add_hash(self, value, now):
+        position = bisect_left(self.hashes, value)
+        if position < len(self.hashes) and self.hashes[position] == value:
+            # Posts still in the feed are refreshed now and then so retention never drops them
+            if now - self.seen_at[position] > self.REFRESH_AFTER:
+                self.seen_at[position] = now
+                self.changed = True
+            return False
+        self.hashes.insert(position, value)
+        self.seen_at.insert(position, now)
+        self.changed = True
+        return True
+
+    def add(self, post, now=None):
+        """Remember a post under all of its identities; returns True if any was new"""
+        now = int(now or time.time())
+        added = False
+        for value in post_hashes(post):
+            added = self.add_hash(value, now) or added
+        return added
+
+    def filter_new(self, posts):
+        """Return the posts none of whose identities are in the index, without adding them"""
+        new_posts = []
+        batch = set()
+        for post in posts:
+            values = post_hashes(post)
+            if any(value in batch or self.contains_hash(value) for value in values):
+                continue
+            batch.update(values)
+            new_posts.append(post)
+        return new_posts
+
+    def add_many(self, posts, now=None):
+        """Remember several posts and apply retention"""
+        now = int(now or time.time())
+        for post in posts:
+            self.add(post, now)
+        self.prune(now)
+
+    def prune(self, now=None):
+        """Drop entries past max_age, then the oldest ones beyond max_entries"""
+        now = int(now or time.time())
+        keep = [i for i in range(len(self.hashes)) if now - self.seen_at[i] <= self.max_age]
+        if len(keep) > self.max_entries:
+            keep.sort(key=lambda i: self.seen_at[i], reverse=True)
+            keep = sorted(keep[:self.max_entries])
+        if len(keep) == len(self.hashes):
+            return
+        self.hashes = array('Q', (self.hashes[i] for i in keep))
+        self.seen_at = array('I', (self.seen_at[i] for i in keep))
+        self.changed = True
+
+    def to_bytes(self):
+        """Serialise as header + little-endian hash array + last-seen array"""
+        hashes = array('Q', self.hashes)
+        seen_at = array('I', self.seen_at)
+        if sys.byteorder != 'little':
+            hashes.byteswap()
+            seen_at.byteswap()
+        return self.HEADER.pack(self.MAGIC, len(hashes)) + hashes.tobytes() + seen_at.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, **kwargs):
+        """Load an index written by to_bytes"""
+        index = cls(**kwargs)
+        magic, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a seen post index")
+        offset = cls.HEADER.size
+        index.hashes.frombytes(data[offset:offset + count * 8])
+        index.seen_at.frombytes(data[offset + count * 8:offset + count * 12])
+        if sys.byteorder != 'little':
+            index.hashes.byteswap()
+            index.seen_at.byteswap()
+        return index
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+SMTP Dispatcher
+Sends notification emails over a small pool of authenticated SMTP
+connections, concurrently and within the provider's rate limit
+"""
+
+import os
+import time
+import queue
+import socket
+import logging
+import smtplib
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying on a fresh connection
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)
+
+
+class SMTPDispatcher:
+    """
+    Pool of SMTP connections that are opened, upgraded with STARTTLS and
+    logged into once, then reused for many messages.
+
+    Messages can be sent right away with send(), or queued with queue() and
+    sent together with flush() at the end of a run.
+    """
+
+    def __init__(self, server=None, port=None, username=None, password=None,
+                 pool_size=None, rate_limit=None, max_retries=None, messages_per_connection=None):
+        self.server = server or os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+        self.port = port or int(os.environ.get('SMTP_PORT', '587'))
+        self.username = username or os.environ.get('SMTP_USERNAME')
+        self.password = password or os.environ.get('SMTP_PASSWORD')
+        self.pool_size = pool_size or int(os.environ.get('SMTP_POOL_SIZE', '3'))
+        # Messages per second across the whole pool
+        self.rate_limit = rate_limit or float(os.environ.get('SMTP_RATE_LIMIT', '5'))
+        if max_retries is None:
+            max_retries = int(os.environ.get('SMTP_MAX_RETRIES', '3'))
+        self.max_retries = max_retries
+        # Providers drop long-lived sessions, so recycle connections periodically
+        self.messages_per_connection = messages_per_connection or int(os.environ.get('SMTP_MESSAGES_PER_CONNECTION', '100'))
+
+        self._idle = queue.LifoQueue()
+        self._open_count = 0
+        self._pool_lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._next_send_at = 0.0
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0, 'connections_opened': 0}
+
+    @property
+    def enabled(self):
+        """Whether SMTP credentials are configured"""
+        return bool(self.username and self.password)
+
+    def connect(self):
+        """Open, secure and authenticate a new SMTP connection"""
+        connection = smtplib.SMTP(self.server, self.port, timeout=30)
+        connection.starttls()
+        connection.login(self.username, self.password)
+        with self._pool_lock:
+            self.stats['connections_opened'] += 1
+        return {'smtp': connection, 'sent': 0}
+
+    def acquire(self):
+        """Take an idle connection, opening one if the pool is not full"""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._pool_lock:
+                can_open = self._open_count < self.pool_size
+                if can_open:
+                    self._open_count += 1
+            if can_open:
+                break
+
+            # Pool is full; wait for a release, re-checking in case a slot was discarded
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+        try:
+            return self.connect()
+        except Exception:
+            with self._pool_lock:
+                self._open_count -= 1
+            raise
+
+    def release(self, connection, broken=False):
+        """Return a connection to the pool, closing it if broken or worn out"""
+        if broken or connection['sent'] >= self.messages_per_connection:
+            self.discard(connection)
+        else:
+            self._idle.put(connection)
+
+    def discard(self, connection):
+        """Close a connection and free its pool slot"""
+        try:
+            connection['smtp'].quit()
+        except Exception:
+            pass
+        with self._pool_lock:
+            self._open_count -= 1
+
+    def wait_for_rate_limit(self):
+        """Space sends out so the pool stays under rate_limit messages per second"""
+        with self._rate_lock:
+            now = time.monotonic()
+            send_at = max(now, self._next_send_at)
+            self._next_send_at = send_at + 1.0 / self.rate_limit
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def is_transient(self, error):
+        """Transient failures are disconnects, timeouts and 4xx replies"""
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        if isinstance(error, smtplib.SMTPException):
+            return False
+        return isinstance(error, OSError)
+
+    def build_message(self, to_email, subject, body):
+        """Create the MIME message for a plain text email"""
+        msg = MIMEMultipart()
+        msg['From'] = self.username
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        return msg.as_string()
+
+    def send(self, to_email, subject, body):
+        """Send one email now, retrying transient failures with backoff"""
+        if not self.enabled:
+            logger.info("SMTP credentials not configured, skipping email")
+            return False
+
+        text = self.build_message(to_email, subject, body)
+        for attempt in range(self.max_retries + 1):
+            connection = None
+            try:
+                self.wait_for_rate_limit()
+                connection = self.acquire()
+                connection['smtp'].sendmail(self.username, to_email, text)
+                connection['sent'] += 1
+                self.release(connection)
+                with self._pool_lock:
+                    self.stats['sent'] += 1
+                logger.info(f"Email sent successfully to {to_email}")
+                return True
+            except Exception as e:
+                if connection is not None:
+                    self.release(connection, broken=True)
+                if attempt < self.max_retries and self.is_transient(e):
+                    with self._pool_lock:
+                        self.stats['retries'] += 1
+                    time.sleep(min(2 ** attempt, 30))
+                    continue
+                logger.error(f"Error sending email to {to_email}: {str(e)}")
+                with self._pool_lock:
+                    self.stats['failed'] += 1
+                return False
+
+    def queue(self, to_email, subject, body):
+        """Queue an email to be sent by the next flush()"""
+        with self._pending_lock:
+            self._pending.append((to_email, subject, body))
+
+    def flush(self):
+        """
+        Send every queued email concurrently over the pool
+
+        Returns:
+            Dictionary with sent, failed, retries and connections_opened counts
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+
+        if pending and self.enabled:
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                list(executor.map(lambda message: self.send(*message), pending))
+        elif pending:
+            logger.info(f"SMTP credentials not configured, skipping {len(pending)} emails")
+
+        return dict(self.stats)
+
+    def close(self):
+        """Quit every idle connection"""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(connection)
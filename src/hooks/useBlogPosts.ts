@@ -19,8 +19,9 @@ export const useBlogPosts = () => {
     queryKey: ['blogPosts'],
     queryFn: async () => {
       console.log('Fetching blog posts...');
+      // The view fills in summary/content for posts stored by reference
       const { data, error } = await supabase
-        .from('blog_posts')
+        .from('blog_posts_full')
         .select(`
           *,
           blogs:blog_id (
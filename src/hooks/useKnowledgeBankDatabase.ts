@@ -34,7 +34,7 @@ export const useKnowledgeBankDatabase = () => {
         .from('knowledge_bank_posts')
         .select(`
           *,
-          blog_posts!inner (
+          blog_posts_full!inner (
             *,
             blogs:blog_id (
               id,
@@ -52,7 +52,7 @@ export const useKnowledgeBankDatabase = () => {
 
       // Transform the data to match the expected format
       const transformedPosts: KnowledgeBankPost[] = (data || []).map((item) => {
-        const post = item.blog_posts;
+        const post = item.blog_posts_full;
         const topic = userTopics.find(t => t.topic_id === post.label_id);
         
         // Extract blog name from URL
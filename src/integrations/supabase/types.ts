@@ -51,6 +51,7 @@ export type Database = {
           is_new: boolean
           label_id: number | null
           link: string | null
+          post_id: string | null
           published_date: string | null
           summary: string | null
           title: string
@@ -64,6 +65,7 @@ export type Database = {
           is_new?: boolean
           label_id?: number | null
           link?: string | null
+          post_id?: string | null
           published_date?: string | null
           summary?: string | null
           title: string
@@ -77,6 +79,7 @@ export type Database = {
           is_new?: boolean
           label_id?: number | null
           link?: string | null
+          post_id?: string | null
           published_date?: string | null
           summary?: string | null
           title?: string
@@ -89,6 +92,13 @@ export type Database = {
             referencedRelation: "blogs"
             referencedColumns: ["id"]
           },
+          {
+            foreignKeyName: "blog_posts_post_id_fkey"
+            columns: ["post_id"]
+            isOneToOne: false
+            referencedRelation: "posts"
+            referencedColumns: ["id"]
+          },
         ]
       }
       blogs: {
@@ -157,6 +167,13 @@ export type Database = {
             referencedRelation: "blog_posts"
             referencedColumns: ["id"]
           },
+          {
+            foreignKeyName: "knowledge_bank_posts_post_id_fkey"
+            columns: ["post_id"]
+            isOneToOne: false
+            referencedRelation: "blog_posts_full"
+            referencedColumns: ["id"]
+          },
         ]
       }
       note_boxes: {
@@ -294,6 +311,42 @@ export type Database = {
           },
         ]
       }
+      posts: {
+        Row: {
+          content: string | null
+          created_at: string
+          detected_at: string
+          id: string
+          link: string
+          published_date: string | null
+          source_url: string
+          summary: string | null
+          title: string
+        }
+        Insert: {
+          content?: string | null
+          created_at?: string
+          detected_at?: string
+          id?: string
+          link: string
+          published_date?: string | null
+          source_url: string
+          summary?: string | null
+          title: string
+        }
+        Update: {
+          content?: string | null
+          created_at?: string
+          detected_at?: string
+          id?: string
+          link?: string
+          published_date?: string | null
+          source_url?: string
+          summary?: string | null
+          title?: string
+        }
+        Relationships: []
+      }
       profiles: {
         Row: {
           avatar_url: string | null
@@ -374,7 +427,38 @@ export type Database = {
       }
     }
     Views: {
-      [_ in never]: never
+      blog_posts_full: {
+        Row: {
+          blog_id: string | null
+          content: string | null
+          created_at: string | null
+          detected_at: string | null
+          id: string | null
+          is_new: boolean | null
+          label_id: number | null
+          link: string | null
+          post_id: string | null
+          published_date: string | null
+          summary: string | null
+          title: string | null
+        }
+        Relationships: [
+          {
+            foreignKeyName: "blog_posts_blog_id_fkey"
+            columns: ["blog_id"]
+            isOneToOne: false
+            referencedRelation: "blogs"
+            referencedColumns: ["id"]
+          },
+          {
+            foreignKeyName: "blog_posts_post_id_fkey"
+            columns: ["post_id"]
+            isOneToOne: false
+            referencedRelation: "posts"
+            referencedColumns: ["id"]
+          },
+        ]
+      }
     }
     Functions: {
       has_role: {
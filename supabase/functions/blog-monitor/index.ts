@@ -279,9 +279,10 @@ class BlogMonitorService {
         detected_at: new Date().toISOString()
       }))
 
+      // Links already stored for this blog are skipped rather than failing the batch
       const { error } = await this.supabase
         .from('blog_posts')
-        .insert(postsToInsert)
+        .upsert(postsToInsert, { onConflict: 'blog_id,link', ignoreDuplicates: true })
 
       if (error) {
         console.error(`Error saving blog posts for user blog ${userBlog.id}:`, error)
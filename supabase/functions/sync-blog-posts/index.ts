@@ -22,6 +22,137 @@ interface BlogChangeRecord {
   timestamp: string;
 }
 
+interface SyncResult {
+  success: boolean;
+  blog_name: string;
+  inserted_posts?: number;
+  message?: string;
+  status?: number;
+}
+
+// Insert the posts of one change record and label them for the blog owner
+async function syncChangeRecord(supabase: any, changeRecord: BlogChangeRecord): Promise<SyncResult> {
+  console.log(`Processing ${changeRecord.new_posts.length} new posts for ${changeRecord.blog_name}`);
+
+  // Find the blog entry
+  let { data: blog, error: blogError } = await supabase
+    .from('blogs')
+    .select('*')
+    .eq('url', changeRecord.blog_url)
+    .single();
+
+  if (blogError && blogError.code === 'PGRST116') {
+    console.log(`Blog ${changeRecord.blog_name} not found in database, skipping...`);
+    return {
+      success: false,
+      blog_name: changeRecord.blog_name,
+      message: 'Blog not found in database. Please add it through the UI first.',
+      status: 400,
+    };
+  }
+
+  if (blogError) {
+    throw blogError;
+  }
+
+  // Insert new blog posts; links already stored for this blog are skipped
+  const blogPosts = changeRecord.new_posts.map(post => ({
+    blog_id: blog.id,
+    title: post.title,
+    link: post.link || null,
+    published_date: post.published ? new Date(post.published).toISOString() : null,
+    summary: post.summary || null,
+    content: post.content || null,
+    is_new: true,
+    detected_at: new Date(changeRecord.timestamp).toISOString(),
+  }));
+
+  const { data: insertedPosts, error: insertError } = await supabase
+    .from('blog_posts')
+    .upsert(blogPosts, { onConflict: 'blog_id,link', ignoreDuplicates: true })
+    .select();
+
+  if (insertError) {
+    throw insertError;
+  }
+
+  // Auto-predict labels for new posts
+  if (insertedPosts && insertedPosts.length > 0) {
+    console.log('Starting label prediction for new posts...');
+
+    // Get user topics for the blog owner, ordered by topic_id for consistent labeling
+    const { data: userTopics, error: topicsError } = await supabase
+      .from('user_topics')
+      .select('*')
+      .eq('user_id', blog.user_id)
+      .order('topic_id', { ascending: true });
+
+    if (!topicsError && userTopics && userTopics.length > 0) {
+      // Simple dummy prediction logic based on post title
+      const predictLabel = (postTitle: string): number => {
+        const title = postTitle.toLowerCase();
+
+        // Define keyword patterns for each topic type
+        const patterns = [
+          ['nlp', 'language', 'text', 'natural', 'processing'],
+          ['mlops', 'deployment', 'pipeline', 'kubernetes', 'docker'],
+          ['vision', 'image', 'cnn', 'detection', 'segmentation'],
+          ['machine learning', 'ml', 'regression', 'classification']
+        ];
+
+        // Check each pattern and return corresponding topic_id
+        for (let i = 0; i < patterns.length && i < userTopics.length; i++) {
+          if (patterns[i].some(keyword => title.includes(keyword))) {
+            return userTopics[i].topic_id; // Return the actual topic_id
+          }
+        }
+
+        // Default to random topic_id from available topics
+        const randomIndex = Math.floor(Math.random() * userTopics.length);
+        return userTopics[randomIndex].topic_id;
+      };
+
+      // Assign predicted labels to posts
+      for (const post of insertedPosts) {
+        const predictedTopicId = predictLabel(post.title);
+
+        const { error: assignError } = await supabase
+          .from('blog_posts')
+          .update({ label_id: predictedTopicId })
+          .eq('id', post.id);
+
+        if (assignError) {
+          console.error(`Error assigning label to post ${post.id}:`, assignError);
+        } else {
+          const topicName = userTopics.find(t => t.topic_id === predictedTopicId)?.name || 'Unknown';
+          console.log(`Assigned label ${predictedTopicId} (${topicName}) to post "${post.title}"`);
+        }
+      }
+    }
+  }
+
+  // Update blog's last_checked timestamp
+  const { error: updateError } = await supabase
+    .from('blogs')
+    .update({ 
+      last_checked: new Date().toISOString(),
+      updated_at: new Date().toISOString()
+    })
+    .eq('id', blog.id);
+
+  if (updateError) {
+    throw updateError;
+  }
+
+  console.log(`Successfully inserted ${insertedPosts?.length} posts for ${changeRecord.blog_name}`);
+
+  return {
+    success: true,
+    inserted_posts: insertedPosts?.length || 0,
+    blog_name: changeRecord.blog_name,
+  };
+}
+
 serve(async (req) => {
   // Handle CORS preflight requests
   if (req.method === 'OPTIONS') {
@@ -35,134 +166,39 @@ serve(async (req) => {
     const supabase = createClient(supabaseUrl, supabaseKey);
 
     if (req.method === 'POST') {
-      const changeRecord: BlogChangeRecord = await req.json();
-      
-      console.log(`Processing ${changeRecord.new_posts.length} new posts for ${changeRecord.blog_name}`);
-
-      // Find the blog entry
-      let { data: blog, error: blogError } = await supabase
-        .from('blogs')
-        .select('*')
-        .eq('url', changeRecord.blog_url)
-        .single();
-
-      if (blogError && blogError.code === 'PGRST116') {
-        console.log(`Blog ${changeRecord.blog_name} not found in database, skipping...`);
+      const payload = await req.json();
+
+      // Batched payload: { records: BlogChangeRecord[] }, one result per record
+      if (Array.isArray(payload.records)) {
+        const results: SyncResult[] = [];
+        for (const record of payload.records as BlogChangeRecord[]) {
+          try {
+            results.push(await syncChangeRecord(supabase, record));
+          } catch (error) {
+            console.error(`Error syncing ${record.blog_name}:`, error);
+            results.push({ success: false, blog_name: record.blog_name, message: error.message });
+          }
+        }
+
         return new Response(
-          JSON.stringify({ 
-            success: false, 
-            message: 'Blog not found in database. Please add it through the UI first.' 
+          JSON.stringify({
+            success: results.every(result => result.success),
+            inserted_posts: results.reduce((total, result) => total + (result.inserted_posts || 0), 0),
+            results: results.map(({ status, ...result }) => result),
           }),
-          { 
-            headers: { ...corsHeaders, 'Content-Type': 'application/json' },
-            status: 400 
+          {
+            headers: { ...corsHeaders, 'Content-Type': 'application/json' }
           }
         );
       }
 
-      if (blogError) {
-        throw blogError;
-      }
-
-      // Insert new blog posts
-      const blogPosts = changeRecord.new_posts.map(post => ({
-        blog_id: blog.id,
-        title: post.title,
-        link: post.link || null,
-        published_date: post.published ? new Date(post.published).toISOString() : null,
-        summary: post.summary || null,
-        content: post.content || null,
-        is_new: true,
-        detected_at: new Date(changeRecord.timestamp).toISOString(),
-      }));
-
-      const { data: insertedPosts, error: insertError } = await supabase
-        .from('blog_posts')
-        .insert(blogPosts)
-        .select();
-
-      if (insertError) {
-        throw insertError;
-      }
-
-      // Auto-predict labels for new posts
-      if (insertedPosts && insertedPosts.length > 0) {
-        console.log('Starting label prediction for new posts...');
-        
-        // Get user topics for the blog owner, ordered by topic_id for consistent labeling
-        const { data: userTopics, error: topicsError } = await supabase
-          .from('user_topics')
-          .select('*')
-          .eq('user_id', blog.user_id)
-          .order('topic_id', { ascending: true });
-
-        if (!topicsError && userTopics && userTopics.length > 0) {
-          // Simple dummy prediction logic based on post title
-          const predictLabel = (postTitle: string): number => {
-            const title = postTitle.toLowerCase();
-            
-            // Define keyword patterns for each topic type
-            const patterns = [
-              ['nlp', 'language', 'text', 'natural', 'processing'],
-              ['mlops', 'deployment', 'pipeline', 'kubernetes', 'docker'],
-              ['vision', 'image', 'cnn', 'detection', 'segmentation'],
-              ['machine learning', 'ml', 'regression', 'classification']
-            ];
-
-            // Check each pattern and return corresponding topic_id
-            for (let i = 0; i < patterns.length && i < userTopics.length; i++) {
-              if (patterns[i].some(keyword => title.includes(keyword))) {
-                return userTopics[i].topic_id; // Return the actual topic_id
-              }
-            }
-            
-            // Default to random topic_id from available topics
-            const randomIndex = Math.floor(Math.random() * userTopics.length);
-            return userTopics[randomIndex].topic_id;
-          };
-
-          // Assign predicted labels to posts
-          for (const post of insertedPosts) {
-            const predictedTopicId = predictLabel(post.title);
-            
-            const { error: assignError } = await supabase
-              .from('blog_posts')
-              .update({ label_id: predictedTopicId })
-              .eq('id', post.id);
-
-            if (assignError) {
-              console.error(`Error assigning label to post ${post.id}:`, assignError);
-            } else {
-              const topicName = userTopics.find(t => t.topic_id === predictedTopicId)?.name || 'Unknown';
-              console.log(`Assigned label ${predictedTopicId} (${topicName}) to post "${post.title}"`);
-            }
-          }
-        }
-      }
-
-      // Update blog's last_checked timestamp
-      const { error: updateError } = await supabase
-        .from('blogs')
-        .update({ 
-          last_checked: new Date().toISOString(),
-          updated_at: new Date().toISOString()
-        })
-        .eq('id', blog.id);
-
-      if (updateError) {
-        throw updateError;
-      }
-
-      console.log(`Successfully inserted ${insertedPosts?.length} posts for ${changeRecord.blog_name}`);
+      const { status, ...result } = await syncChangeRecord(supabase, payload as BlogChangeRecord);
 
       return new Response(
-        JSON.stringify({ 
-          success: true, 
-          inserted_posts: insertedPosts?.length || 0,
-          blog_name: changeRecord.blog_name
-        }),
+        JSON.stringify(result),
         { 
-          headers: { ...corsHeaders, 'Content-Type': 'application/json' } 
+          headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+          status: status || 200
         }
       );
     }
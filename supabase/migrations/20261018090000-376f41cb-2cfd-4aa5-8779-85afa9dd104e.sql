@@ -0,0 +1,78 @@
+-- Remove duplicate posts per blog so (blog_id, link) can be made unique,
+-- keeping the earliest detected copy. Knowledge bank entries and topic
+-- links reference blog_posts ON DELETE CASCADE, so they are moved to the
+-- kept copy first instead of being deleted with the duplicates.
+
+-- Each duplicate post and the copy that is kept in its place
+CREATE TEMP TABLE blog_post_duplicates AS
+SELECT id AS duplicate_id, kept_id
+FROM (
+  SELECT id,
+         first_value(id) OVER (PARTITION BY blog_id, link ORDER BY created_at, id) AS kept_id
+  FROM public.blog_posts
+  WHERE link IS NOT NULL
+) ranked
+WHERE id <> kept_id;
+
+-- Knowledge bank entries on a kept post or its duplicates, grouped per user;
+-- the entry already on the kept post (else the earliest added) survives
+CREATE TEMP TABLE knowledge_bank_merges AS
+SELECT k.id,
+       k.user_id,
+       COALESCE(d.kept_id, k.post_id) AS kept_id,
+       k.notes,
+       row_number() OVER (
+         PARTITION BY k.user_id, COALESCE(d.kept_id, k.post_id)
+         ORDER BY (d.duplicate_id IS NULL) DESC, k.added_at, k.id
+       ) AS rank
+FROM public.knowledge_bank_posts k
+LEFT JOIN blog_post_duplicates d ON d.duplicate_id = k.post_id
+WHERE k.post_id IN (SELECT duplicate_id FROM blog_post_duplicates)
+   OR k.post_id IN (SELECT kept_id FROM blog_post_duplicates);
+
+-- The surviving entry moves to the kept post and keeps every merged entry's notes
+UPDATE public.knowledge_bank_posts k
+SET post_id = survivor.kept_id,
+    notes = COALESCE((
+      SELECT string_agg(merged.notes, E'\n\n' ORDER BY merged.rank)
+      FROM knowledge_bank_merges merged
+      WHERE merged.user_id = survivor.user_id
+        AND merged.kept_id = survivor.kept_id
+        AND NULLIF(merged.notes, '') IS NOT NULL
+    ), k.notes)
+FROM knowledge_bank_merges survivor
+WHERE k.id = survivor.id
+  AND survivor.rank = 1;
+
+DELETE FROM public.knowledge_bank_posts k
+USING knowledge_bank_merges merged
+WHERE k.id = merged.id
+  AND merged.rank > 1;
+
+-- Topic links move to the kept post unless it already has that topic
+UPDATE public.post_topics t
+SET post_id = moved.kept_id
+FROM (
+  SELECT DISTINCT ON (d.kept_id, pt.topic_id) pt.id, d.kept_id
+  FROM public.post_topics pt
+  JOIN blog_post_duplicates d ON d.duplicate_id = pt.post_id
+  WHERE NOT EXISTS (
+    SELECT 1 FROM public.post_topics kept
+    WHERE kept.post_id = d.kept_id
+      AND kept.topic_id = pt.topic_id
+  )
+  ORDER BY d.kept_id, pt.topic_id, pt.created_at, pt.id
+) moved
+WHERE t.id = moved.id;
+
+-- Only now drop the duplicates; links left on them repeat ones the kept post has
+DELETE FROM public.blog_posts a
+USING blog_post_duplicates d
+WHERE a.id = d.duplicate_id;
+
+DROP TABLE knowledge_bank_merges;
+DROP TABLE blog_post_duplicates;
+
+-- Conflict target for the monitor's batched upserts, making reruns idempotent
+ALTER TABLE public.blog_posts
+ADD CONSTRAINT blog_posts_blog_id_link_unique UNIQUE (blog_id, link);
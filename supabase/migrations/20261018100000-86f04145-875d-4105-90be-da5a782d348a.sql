@@ -0,0 +1,57 @@
+-- One canonical copy of each detected post, keyed by the admin_blogs URL it
+-- was found on and its link, shared by every subscriber of that blog
+CREATE TABLE public.posts (
+  id UUID NOT NULL DEFAULT gen_random_uuid() PRIMARY KEY,
+  source_url TEXT NOT NULL,
+  link TEXT NOT NULL,
+  title TEXT NOT NULL,
+  published_date TIMESTAMP WITH TIME ZONE,
+  summary TEXT,
+  content TEXT,
+  detected_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  CONSTRAINT posts_source_url_link_unique UNIQUE (source_url, link)
+);
+
+-- Subscriber rows in blog_posts point at the shared post instead of
+-- carrying their own summary and content
+ALTER TABLE public.blog_posts
+ADD COLUMN post_id UUID REFERENCES public.posts(id) ON DELETE CASCADE;
+
+CREATE INDEX idx_blog_posts_post_id ON public.blog_posts(post_id);
+
+ALTER TABLE public.posts ENABLE ROW LEVEL SECURITY;
+
+-- Users can read a shared post when one of their blogs references it
+CREATE POLICY "Users can view posts referenced by their blogs"
+  ON public.posts
+  FOR SELECT
+  USING (EXISTS (
+    SELECT 1 FROM public.blog_posts bp
+    JOIN public.blogs b ON bp.blog_id = b.id
+    WHERE bp.post_id = posts.id
+    AND b.user_id = auth.uid()
+  ));
+
+-- blog_posts with summary and content filled in from the shared post, so
+-- readers see the same rows whether a post was stored as a copy or by
+-- reference. Runs with the caller's rights, so the RLS policies above apply.
+CREATE VIEW public.blog_posts_full
+WITH (security_invoker = true) AS
+SELECT
+  bp.id,
+  bp.blog_id,
+  bp.post_id,
+  bp.title,
+  bp.link,
+  COALESCE(bp.published_date, p.published_date) AS published_date,
+  COALESCE(bp.summary, p.summary) AS summary,
+  COALESCE(bp.content, p.content) AS content,
+  bp.is_new,
+  bp.label_id,
+  bp.detected_at,
+  bp.created_at
+FROM public.blog_posts bp
+LEFT JOIN public.posts p ON p.id = bp.post_id;
+
+GRANT SELECT ON public.blog_posts_full TO anon, authenticated;
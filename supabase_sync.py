@@ -8,19 +8,75 @@ Syncs detected blog changes with Supabase database
 import requests
 import json
 import os
+import atexit
+import asyncio
+import threading
+import weakref
+import importlib.util
 import ssl
 import urllib3
 from datetime import datetime
+from collections import OrderedDict
+from pathlib import Path
+
+
+def load_http_session():
+    """
+    Load the monitor's http_session module by file path
+
+    Only that one file is loaded, under a private module name, so the
+    aws-lambda directory never goes on sys.path where its modules
+    (metrics, cache_store, ...) could shadow others of the same name.
+    """
+    path = Path(__file__).resolve().parent / 'aws-lambda' / 'http_session.py'
+    spec = importlib.util.spec_from_file_location('_blog_monitor_http_session', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Edge function calls share the monitor's pooled session and retry policy
+get_session = load_http_session().get_session
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class SupabaseSync:
-    def __init__(self, supabase_url, supabase_anon_key):
+    def __init__(self, supabase_url, supabase_anon_key, session=None):
         self.supabase_url = supabase_url
         self.supabase_anon_key = supabase_anon_key
+        self.session = session or get_session()
         self.edge_function_url = f"{supabase_url}/functions/v1/sync-blog-posts"
         
+    def post_payload(self, payload):
+        """POST a JSON payload to the sync-blog-posts edge function"""
+        headers = {
+            'Authorization': f'Bearer {self.supabase_anon_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        # Try with SSL verification first
+        try:
+            return self.session.post(
+                self.edge_function_url,
+                headers=headers,
+                json=payload,
+                timeout=30,
+                verify=True
+            )
+        except requests.exceptions.SSLError as ssl_error:
+            print(f"⚠️  SSL verification failed, retrying without SSL verification...")
+            print(f"SSL Error: {ssl_error}")
+            
+            # Retry without SSL verification
+            return self.session.post(
+                self.edge_function_url,
+                headers=headers,
+                json=payload,
+                timeout=30,
+                verify=False  # Disable SSL verification
+            )
+        
     def sync_blog_changes(self, change_record):
         """
         Sync blog changes to Supabase
@@ -30,32 +86,7 @@ class SupabaseSync:
                           with keys: 'blog_name', 'blog_url', 'new_posts', 'timestamp'
         """
         try:
-            headers = {
-                'Authorization': f'Bearer {self.supabase_anon_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            # Try with SSL verification first
-            try:
-                response = requests.post(
-                    self.edge_function_url,
-                    headers=headers,
-                    json=change_record,
-                    timeout=30,
-                    verify=True
-                )
-            except requests.exceptions.SSLError as ssl_error:
-                print(f"⚠️  SSL verification failed, retrying without SSL verification...")
-                print(f"SSL Error: {ssl_error}")
-                
-                # Retry without SSL verification
-                response = requests.post(
-                    self.edge_function_url,
-                    headers=headers,
-                    json=change_record,
-                    timeout=30,
-                    verify=False  # Disable SSL verification
-                )
+            response = self.post_payload(change_record)
             
             if response.status_code == 200:
                 result = response.json()
@@ -79,6 +110,232 @@ class SupabaseSync:
         except Exception as e:
             print(f"❌ Error syncing {change_record['blog_name']}: {str(e)}")
             return False
+    
+    def sync_batch(self, change_records):
+        """
+        Sync several change records in a single edge function call
+        
+        Returns:
+            True if every record in the batch was synced
+        """
+        if not change_records:
+            return True
+        
+        try:
+            response = self.post_payload({'records': change_records})
+            
+            if response.status_code != 200:
+                print(f"❌ HTTP {response.status_code}: Failed to sync batch of {len(change_records)} blogs")
+                print(f"Response: {response.text}")
+                return False
+            
+            result = response.json()
+            for record_result in result.get('results', []):
+                if record_result.get('success'):
+                    print(f"✅ Successfully synced {record_result.get('inserted_posts', 0)} posts for {record_result.get('blog_name')}")
+                else:
+                    print(f"❌ Failed to sync {record_result.get('blog_name')}: {record_result.get('message', 'Unknown error')}")
+            return bool(result.get('success'))
+            
+        except Exception as e:
+            print(f"❌ Error syncing batch of {len(change_records)} blogs: {str(e)}")
+            return False
+
+
+class ChangeRecordBuffer:
+    """
+    Change records merged by blog_url as they are added
+    
+    Posts are de-duplicated by link (or title when there is no link), and the
+    latest record's blog_name and timestamp win. Each record is merged in
+    time proportional to its own posts, however many are buffered.
+    """
+    
+    def __init__(self):
+        self.records = OrderedDict()
+        # blog_url -> keys of the posts already merged for it
+        self.post_keys = {}
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def add(self, record):
+        seen = self.post_keys.setdefault(record['blog_url'], set())
+        existing = self.records.get(record['blog_url'])
+        if existing is None:
+            existing = self.records[record['blog_url']] = dict(record, new_posts=[])
+        else:
+            existing['blog_name'] = record.get('blog_name', existing.get('blog_name'))
+            existing['timestamp'] = max(existing.get('timestamp', ''), record.get('timestamp', ''))
+        
+        for post in record.get('new_posts', []):
+            post_key = post.get('link') or post.get('title')
+            if post_key not in seen:
+                seen.add(post_key)
+                existing['new_posts'].append(post)
+    
+    def take(self):
+        """Return the merged records and empty the buffer"""
+        records = list(self.records.values())
+        self.records = OrderedDict()
+        self.post_keys = {}
+        return records
+
+
+def merge_change_records(change_records):
+    """Merge change records that share a blog_url"""
+    buffer = ChangeRecordBuffer()
+    for record in change_records:
+        buffer.add(record)
+    return buffer.take()
+
+
+# Batching syncs still buffering at exit; held weakly so the exit hook never keeps one alive
+_open_batching_syncs = weakref.WeakSet()
+
+
+def _flush_open_batching_syncs():
+    for sync in list(_open_batching_syncs):
+        sync.flush()
+
+
+atexit.register(_flush_open_batching_syncs)
+
+
+class BatchingSupabaseSync(SupabaseSync):
+    """
+    SupabaseSync that buffers change records and sends them in batches
+    
+    Records for the same blog_url are merged. The buffer is flushed once it
+    holds batch_size blogs or flush_interval seconds after the first buffered
+    record, and again when the sync is closed or the process exits. Only
+    swapping the buffer out is done under the lock, so callers never wait
+    for a batch request in flight.
+    """
+    
+    def __init__(self, supabase_url, supabase_anon_key, session=None, batch_size=None, flush_interval=None):
+        super().__init__(supabase_url, supabase_anon_key, session)
+        self.batch_size = batch_size or int(os.environ.get('SYNC_BATCH_SIZE', '50'))
+        self.flush_interval = flush_interval or float(os.environ.get('SYNC_FLUSH_INTERVAL', '5'))
+        self._buffer = ChangeRecordBuffer()
+        self._lock = threading.Lock()
+        self._timer = None
+        _open_batching_syncs.add(self)
+    
+    def sync_blog_changes(self, change_record):
+        """Buffer a change record; it is sent with the next batch"""
+        with self._lock:
+            self._buffer.add(change_record)
+            full = len(self._buffer) >= self.batch_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            return self.flush()
+        return True
+    
+    def flush(self):
+        """Send everything buffered in one request"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            records = self._buffer.take()
+        return self.sync_batch(records)
+    
+    def close(self):
+        """Flush the buffer and drop out of the exit flush"""
+        _open_batching_syncs.discard(self)
+        return self.flush()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncSupabaseSync(SupabaseSync):
+    """
+    asyncio variant of BatchingSupabaseSync
+    
+    Use it as an async context manager; everything still buffered is flushed
+    on exit. At most max_concurrency batch requests are in flight at once.
+    """
+    
+    def __init__(self, supabase_url, supabase_anon_key, session=None, batch_size=None,
+                 flush_interval=None, max_concurrency=None):
+        super().__init__(supabase_url, supabase_anon_key, session)
+        self.batch_size = batch_size or int(os.environ.get('SYNC_BATCH_SIZE', '50'))
+        self.flush_interval = flush_interval or float(os.environ.get('SYNC_FLUSH_INTERVAL', '5'))
+        self.max_concurrency = max_concurrency or int(os.environ.get('SYNC_MAX_CONCURRENCY', '4'))
+        self._buffer = ChangeRecordBuffer()
+        self._semaphore = None
+        self._pending = set()
+        # Outcomes of batches finished since the last flush()
+        self._completed = []
+        self._timer_task = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+    
+    async def sync_blog_changes(self, change_record):
+        """Buffer a change record; it is sent with the next batch"""
+        self._buffer.add(change_record)
+        if len(self._buffer) >= self.batch_size:
+            self.start_flush()
+        elif self._timer_task is None:
+            self._timer_task = asyncio.ensure_future(self._flush_later())
+        return True
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer_task = None
+        self.start_flush()
+    
+    def start_flush(self):
+        """Send the current buffer in the background"""
+        if self._timer_task is not None and self._timer_task is not asyncio.current_task():
+            self._timer_task.cancel()
+        self._timer_task = None
+        records = self._buffer.take()
+        if not records:
+            return
+        task = asyncio.ensure_future(self._send(records))
+        self._pending.add(task)
+        task.add_done_callback(self._finished)
+    
+    def _finished(self, task):
+        self._pending.discard(task)
+        if not task.cancelled():
+            self._completed.append(task.exception() is None and task.result())
+    
+    async def _send(self, records):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.to_thread(self.sync_batch, records)
+    
+    async def flush(self):
+        """
+        Send everything buffered and wait for all in-flight batches
+        
+        Returns:
+            True if every batch sent since the last flush() succeeded,
+            including ones that finished before this call
+        """
+        self.start_flush()
+        await asyncio.gather(*list(self._pending), return_exceptions=True)
+        results, self._completed = self._completed, []
+        return all(results)
+    
+    async def close(self):
+        """Flush on exit"""
+        return await self.flush()
 
 # Example usage and integration with your existing BlogMonitor class
 def integrate_with_blog_monitor():